@@ -0,0 +1,466 @@
+import sys, os, json, time, random, shutil, hashlib, argparse, platform, statistics, subprocess, tempfile
+
+"""
+Benchmark harness for the pre-push rebuild decision ...
+A. generates throwaway git repositories shaped like the
+   EdgeZoneRP tree: namespaces as dirs under src/EdgeZoneRP,
+   a root dir of controllers, a swagger spec, 'using' fan-out
+   and optional namespace cycles, plus one unpushed commit
+B. runs the real hook (pre-push.py) against each of them as
+   git would, with --trace, and reports cold (no dependency
+   index) and warm latency, subprocess counts and peak memory
+C. results are written as JSON keyed by case, so a run on one
+   commit can be compared with a run on another (--compare)
+
+e.g. python pre-push-bench.py --files 1000,10000,100000 --output before.json
+     python pre-push-bench.py --files 1000,10000,100000 --compare before.json
+"""
+
+"""
+Defaults of the generated repositories
+"""
+BENCH_DEFAULTS = {
+    "FILES"               : "1000,10000", # total .cs files, one case per value
+    "DEPTH"               : 3, # namespace (dir) depth below src/EdgeZoneRP
+    "FILES_PER_NAMESPACE" : 20,
+    "FAN_OUT"             : 3, # 'using EdgeZoneRP.*;' lines per file
+    "CYCLES"              : 10, # namespace pairs that 'using' each other
+    "PUSH_SIZE"           : 5, # files changed by the unpushed commit
+    "PUSH_CHANGE"         : "member", # what it changes: "member" (code) or "comment" (hunk filtered)
+    "ROOT_FRACTION"       : 0.05, # share of the files that are controllers
+    "RUNS"                : 3, # cold and warm runs per case
+    "SEED"                : 1,
+    "HOOK_PATH"           : os.path.join(os.path.dirname(os.path.abspath(__file__)), "pre-push.py"),
+    "ROOT_DIRECTORY"      : "test", # the hook's CONSTANTS["ROOT_DIRECTORIES"]
+    "NAMESPACE_PATH"      : "src/EdgeZoneRP", # the hook's CONSTANTS["BASE_NAMESPACE_PATH"]
+    "INDEX_FILE"          : "pre-push-dependencies.sqlite", # the hook's dependency index
+    "NOTES_REF"           : "refs/notes/pre-push-verdicts" # the hook's CONSTANTS["VERDICT_NOTES_REF"]
+}
+
+
+"""
+Function returns the namespaces (as tuples of
+segments) of a tree of the given depth that has
+at least namespace_count leaves ...
+param: namespace_count (int)
+param: depth (int)
+return: (list) of namespace tuples, leaves only
+"""
+def build_namespaces(namespace_count, depth):
+    branching = 1
+    while branching ** depth < namespace_count:
+        branching += 1
+    namespaces = [()]
+    for level in range(depth):
+        namespaces = [namespace + (f'Ns{level}_{index}',)
+                      for namespace in namespaces for index in range(branching)]
+    return namespaces[:namespace_count]
+
+
+"""
+Function writes the content of one generated C# file
+param: namespace (tuple of segments)
+param: class_name (str)
+param: dependencies (list of namespace tuples)
+return: content (bytes)
+"""
+def render_source_file(namespace, class_name, dependencies):
+    lines = ["using System;", "using System.Linq;"]
+    lines.extend(f'using EdgeZoneRP.{".".join(dependency)};' for dependency in dependencies)
+    lines.append("")
+    lines.append(f'namespace EdgeZoneRP.{".".join(namespace)}' if namespace else "namespace EdgeZoneRP")
+    lines.append("{")
+    lines.append(f'    // generated by pre-push-bench')
+    lines.append(f'    public class {class_name}')
+    lines.append("    {")
+    lines.append(f'        public string Name => "{class_name}";')
+    lines.append("    }")
+    lines.append("}")
+    return ("\n".join(lines) + "\n").encode()
+
+
+"""
+Function generates the files of one case as a
+{repo relative path: content} dict, deterministically
+from the seed ...
+param: case (dict) the generation parameters
+return: (dict) path -> content (bytes)
+"""
+def generate_files(case):
+    generator = random.Random(case["seed"])
+    root_count = max(1, int(case["files"] * case["root_fraction"]))
+    source_count = max(1, case["files"] - root_count)
+    namespace_count = max(1, -(-source_count // case["files_per_namespace"]))
+    namespaces = build_namespaces(namespace_count, case["depth"])
+
+    # namespace -> extra dependencies closing the cycles
+    cycle_dependencies = {}
+    for _ in range(min(case["cycles"], len(namespaces) // 2)):
+        first, second = generator.sample(namespaces, 2)
+        cycle_dependencies.setdefault(first, []).append(second)
+        cycle_dependencies.setdefault(second, []).append(first)
+
+    files = {}
+    namespace_path = case["namespace_path"]
+    for index in range(source_count):
+        namespace = namespaces[index % len(namespaces)]
+        dependencies = generator.sample(namespaces, min(case["fan_out"], len(namespaces)))
+        if index < len(namespaces):
+            # the first file of every namespace closes its cycles
+            dependencies.extend(cycle_dependencies.get(namespace, []))
+        dependencies = [dependency for dependency in dependencies if dependency != namespace]
+        path = "/".join([namespace_path, *namespace, f'Model{index}.cs'])
+        files[path] = render_source_file(namespace, f'Model{index}', dependencies)
+
+    root_directory = case["root_directory"]
+    for index in range(root_count):
+        dependencies = generator.sample(namespaces, min(case["fan_out"], len(namespaces)))
+        # group the controllers so the root dir has dirs and files
+        group = f'Group{index % 10}/' if index % 3 else ""
+        path = f'{root_directory}/{group}Controller{index}.cs'
+        files[path] = render_source_file(("Controllers",), f'Controller{index}', dependencies)
+
+    files["docs/api/swagger"] = b'{"swagger": "2.0", "paths": {}}\n'
+    files["src/Startup.cs"] = b'public class Startup {}\n'
+    return files
+
+
+"""
+Function streams a commit into git fast-import
+(much faster than writing and adding 100k files)
+param: stream (binary file) fast-import's stdin
+param: files (dict) path -> content, None deletes
+param: message (str)
+param: parent_mark (int) or None
+param: mark (int)
+param: epoch (int) commit time
+"""
+def write_fast_import_commit(stream, files, message, parent_mark, mark, epoch):
+    stream.write(f'commit refs/heads/master\nmark :{mark}\n'.encode())
+    stream.write(f'committer Bench <bench@example.com> {epoch} +0000\n'.encode())
+    message_bytes = message.encode()
+    stream.write(f'data {len(message_bytes)}\n'.encode() + message_bytes + b"\n")
+    if parent_mark:
+        stream.write(f'from :{parent_mark}\n'.encode())
+    for path, content in files.items():
+        if content is None:
+            stream.write(f'D {path}\n'.encode())
+            continue
+        stream.write(f'M 100644 inline {path}\ndata {len(content)}\n'.encode())
+        stream.write(content + b"\n")
+    stream.write(b"\n")
+
+
+"""
+Function creates the repository of one case ...
+1. the generated tree is committed and recorded as
+   already pushed (refs/remotes/origin/master)
+2. a second, unpushed commit changes push_size files: a
+   new member (code, so the dependency analysis runs) or
+   just a comment (settled by the hook's hunk filter)
+3. the swagger spec is made newer than every commit and
+   the reflog is left without checkouts, so the hook goes
+   through the full dependency analysis
+param: repo_dir (str)
+param: case (dict) the generation parameters
+return: (local_oid, remote_oid)
+"""
+def create_repository(repo_dir, case):
+    files = generate_files(case)
+    generator = random.Random(case["seed"] + 1)
+    source_paths = sorted(path for path in files if path.startswith(case["namespace_path"] + "/"))
+    pushed_paths = generator.sample(source_paths, min(case["push_size"], len(source_paths)))
+    if case["push_change"] == "comment":
+        changes = {path: files[path] + b"// changed\n" for path in pushed_paths}
+    else:
+        changes = {path: files[path].replace(b'";\n    }\n', b'";\n        public int Revision => 2;\n    }\n', 1)
+                   for path in pushed_paths}
+
+    subprocess.run(["git", "init", "-q", "-b", "master", repo_dir], check=True)
+    epoch = int(time.time()) - 3600
+    process = subprocess.Popen(["git", "fast-import", "--quiet"], stdin=subprocess.PIPE, cwd=repo_dir)
+    write_fast_import_commit(process.stdin, files, "generated tree", None, 1, epoch)
+    write_fast_import_commit(process.stdin, changes, "unpushed change", 1, 2, epoch + 60)
+    process.stdin.close()
+    if process.wait() != 0:
+        raise RuntimeError("git fast-import failed")
+
+    def rev_parse(revision):
+        return subprocess.run(["git", "rev-parse", revision], cwd=repo_dir, check=True,
+                              stdout=subprocess.PIPE, text=True).stdout.strip()
+    local_oid = rev_parse("master")
+    remote_oid = rev_parse("master~1")
+    subprocess.run(["git", "update-ref", "refs/remotes/origin/master", remote_oid],
+                   cwd=repo_dir, check=True)
+    subprocess.run(["git", "reset", "-q", "--hard", "master"], cwd=repo_dir, check=True)
+    swagger_path = os.path.join(repo_dir, "docs", "api", "swagger")
+    future = time.time() + 10 * 365 * 24 * 3600
+    os.utime(swagger_path, (future, future))
+    return local_oid, remote_oid
+
+
+"""
+Function returns a short key of a case's generation
+parameters, used to reuse repositories between runs
+param: case (dict)
+return: key (str)
+"""
+def get_case_key(case):
+    parameters = json.dumps(case, sort_keys=True)
+    return hashlib.sha1(parameters.encode()).hexdigest()[:12]
+
+
+"""
+Function returns (and creates when missing) the
+repository of a case under work_dir ...
+param: work_dir (str)
+param: case (dict)
+return: (repo_dir, local_oid, remote_oid, generation seconds)
+"""
+def prepare_repository(work_dir, case):
+    repo_dir = os.path.join(work_dir, f'repo-{case["files"]}-{get_case_key(case)}')
+    marker_path = os.path.join(repo_dir, ".git", "pre-push-bench.json")
+    if os.path.isfile(marker_path):
+        with open(marker_path) as marker_file:
+            marker = json.load(marker_file)
+        return repo_dir, marker["local_oid"], marker["remote_oid"], 0.0
+
+    shutil.rmtree(repo_dir, ignore_errors=True)
+    started = time.perf_counter()
+    local_oid, remote_oid = create_repository(repo_dir, case)
+    generation_seconds = time.perf_counter() - started
+    with open(marker_path, "w") as marker_file:
+        json.dump({"case": case, "local_oid": local_oid, "remote_oid": remote_oid}, marker_file)
+    return repo_dir, local_oid, remote_oid, generation_seconds
+
+
+"""
+Function runs the hook once against a repository,
+the way git does (remote name/url as args, push
+lines on stdin), and measures it ...
+param: hook_path (str)
+param: repo_dir (str)
+param: local_oid (str)
+param: remote_oid (str)
+return: (dict) wall seconds, decision seconds, peak rss, trace
+"""
+def run_hook(hook_path, repo_dir, local_oid, remote_oid):
+    trace_path = os.path.join(repo_dir, ".git", "pre-push-bench-trace.json")
+    if os.path.exists(trace_path):
+        os.remove(trace_path)
+    push_line = f'refs/heads/master {local_oid} refs/heads/master {remote_oid}\n'
+    # no decision budget: the whole analysis is what gets measured
+    environment = dict(os.environ, PRE_PUSH_TRACE=trace_path, PRE_PUSH_TRACE_FORMAT="json",
+                       PRE_PUSH_DECISION_BUDGET="0")
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, hook_path, "origin", "bench://origin"],
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                               stderr=subprocess.DEVNULL, cwd=repo_dir, env=environment)
+    process.stdin.write(push_line.encode())
+    process.stdin.close()
+    output = process.stdout.read().decode(errors="replace")
+    # wait4 gives this child's own peak memory
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    wall_seconds = time.perf_counter() - started
+    process.stdout.close()
+
+    trace = {}
+    if os.path.isfile(trace_path):
+        with open(trace_path) as trace_file:
+            trace = json.load(trace_file)
+    # the build itself is not part of the decision
+    build_seconds = trace.get("phases", {}).get("handle_push", {}).get("seconds", 0.0)
+    # ru_maxrss is KiB on linux, bytes on macOS
+    peak_rss_kib = usage.ru_maxrss // 1024 if sys.platform == "darwin" else usage.ru_maxrss
+    return {
+        "exit_code": process.returncode,
+        "rebuild": "needs to be rebuilt" in output,
+        "wall_seconds": wall_seconds,
+        "decision_seconds": wall_seconds - build_seconds,
+        "peak_rss_kib": peak_rss_kib,
+        "subprocesses": trace.get("subprocesses", {}).get("count"),
+        "subprocess_seconds": trace.get("subprocesses", {}).get("seconds"),
+        "phases": {name: phase["seconds"] for name, phase in trace.get("phases", {}).items()},
+        "counters": trace.get("counters", {}),
+    }
+
+
+"""
+Function summarizes repeated runs: median latency,
+the fastest run and the largest peak memory ...
+param: runs (list of run_hook results)
+return: (dict)
+"""
+def summarize_runs(runs):
+    return {
+        "decision_ms_median": statistics.median(run["decision_seconds"] for run in runs) * 1000,
+        "decision_ms_min": min(run["decision_seconds"] for run in runs) * 1000,
+        "wall_ms_median": statistics.median(run["wall_seconds"] for run in runs) * 1000,
+        "peak_rss_kib": max(run["peak_rss_kib"] for run in runs),
+        "subprocesses": runs[-1]["subprocesses"],
+        "rebuild": runs[-1]["rebuild"],
+        "exit_code": max(run["exit_code"] for run in runs),
+        "phases_ms": {name: seconds * 1000 for name, seconds in runs[-1]["phases"].items()},
+        "counters": runs[-1]["counters"],
+    }
+
+
+"""
+Function drops the verdicts the hook recorded in git
+notes, else every run after the first just reads the
+recorded verdict back instead of analysing the push
+param: repo_dir (str)
+"""
+def remove_recorded_verdicts(repo_dir):
+    subprocess.run(["git", "update-ref", "-d", BENCH_DEFAULTS["NOTES_REF"]], cwd=repo_dir,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+"""
+Function benchmarks one case ...
+A. cold: the dependency index is removed before every run
+B. warm: the index left by the previous run is reused
+The recorded verdicts are removed before every run
+param: hook_path (str)
+param: work_dir (str)
+param: case (dict)
+param: runs (int)
+return: (dict) the case's result
+"""
+def benchmark_case(hook_path, work_dir, case, runs):
+    repo_dir, local_oid, remote_oid, generation_seconds = prepare_repository(work_dir, case)
+    index_path = os.path.join(repo_dir, ".git", BENCH_DEFAULTS["INDEX_FILE"])
+    cold_runs = []
+    for _ in range(runs):
+        if os.path.exists(index_path):
+            os.remove(index_path)
+        remove_recorded_verdicts(repo_dir)
+        cold_runs.append(run_hook(hook_path, repo_dir, local_oid, remote_oid))
+    warm_runs = []
+    for _ in range(runs):
+        remove_recorded_verdicts(repo_dir)
+        warm_runs.append(run_hook(hook_path, repo_dir, local_oid, remote_oid))
+    return {
+        "case": case,
+        "generation_seconds": generation_seconds,
+        "cold": summarize_runs(cold_runs),
+        "warm": summarize_runs(warm_runs),
+    }
+
+
+"""
+Function returns the commit of the hook being measured
+so results from different commits can be told apart
+param: hook_path (str)
+return: commit (str) or None, with '+dirty' for local edits
+"""
+def get_hook_revision(hook_path):
+    hook_dir = os.path.dirname(hook_path)
+    result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=hook_dir,
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    if result.returncode != 0:
+        return None
+    status = subprocess.run(["git", "status", "--porcelain", "--", hook_path], cwd=hook_dir,
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    return result.stdout.strip() + ("+dirty" if status.stdout.strip() else "")
+
+
+"""
+Function prints the results as a table, with the
+change against a previous result file if given
+param: results (dict) as written by this script
+param: baseline (dict) or None
+"""
+def print_results(results, baseline):
+    baseline_cases = {}
+    if baseline:
+        baseline_cases = {get_case_key(case["case"]): case for case in baseline["cases"]}
+    print(f'hook {results["hook_revision"]}  python {results["python"]}  git {results["git"]}')
+    if baseline:
+        print(f'compared with hook {baseline.get("hook_revision")}')
+    header = f'{"files":>8} {"mode":<5} {"decision ms":>12} {"min ms":>9} {"procs":>6} {"peak MiB":>9} {"rebuild":>8}'
+    print(header)
+    for case_result in results["cases"]:
+        previous = baseline_cases.get(get_case_key(case_result["case"]))
+        for mode in ("cold", "warm"):
+            summary = case_result[mode]
+            line = (f'{case_result["case"]["files"]:>8} {mode:<5} '
+                    f'{summary["decision_ms_median"]:>12.1f} {summary["decision_ms_min"]:>9.1f} '
+                    f'{summary["subprocesses"] if summary["subprocesses"] is not None else "?":>6} '
+                    f'{summary["peak_rss_kib"] / 1024:>9.1f} {str(summary["rebuild"]):>8}')
+            if previous:
+                before = previous[mode]["decision_ms_median"]
+                change = (summary["decision_ms_median"] - before) / before * 100 if before else 0.0
+                line += f'   {change:+.1f}% vs {before:.1f} ms'
+            print(line)
+
+
+"""
+Function reads the command line options
+return: argparse.Namespace
+"""
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark the pre-push rebuild decision")
+    parser.add_argument("--files", default=BENCH_DEFAULTS["FILES"],
+                        help="comma separated file counts, one case each")
+    parser.add_argument("--depth", type=int, default=BENCH_DEFAULTS["DEPTH"])
+    parser.add_argument("--files-per-namespace", type=int, default=BENCH_DEFAULTS["FILES_PER_NAMESPACE"])
+    parser.add_argument("--fan-out", type=int, default=BENCH_DEFAULTS["FAN_OUT"])
+    parser.add_argument("--cycles", type=int, default=BENCH_DEFAULTS["CYCLES"])
+    parser.add_argument("--push-size", type=int, default=BENCH_DEFAULTS["PUSH_SIZE"])
+    parser.add_argument("--push-change", choices=["member", "comment"], default=BENCH_DEFAULTS["PUSH_CHANGE"])
+    parser.add_argument("--root-fraction", type=float, default=BENCH_DEFAULTS["ROOT_FRACTION"])
+    parser.add_argument("--runs", type=int, default=BENCH_DEFAULTS["RUNS"])
+    parser.add_argument("--seed", type=int, default=BENCH_DEFAULTS["SEED"])
+    parser.add_argument("--hook", default=BENCH_DEFAULTS["HOOK_PATH"], help="hook to measure")
+    parser.add_argument("--work-dir", help="keeps (and reuses) the generated repositories")
+    parser.add_argument("--output", help="writes the results as JSON")
+    parser.add_argument("--compare", help="a previous --output file to compare with")
+    return parser.parse_args()
+
+
+if __name__=="__main__":
+    arguments = parse_arguments()
+    hook_path = os.path.abspath(arguments.hook)
+    baseline = None
+    if arguments.compare:
+        with open(arguments.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    work_dir = arguments.work_dir or tempfile.mkdtemp(prefix="pre-push-bench-")
+    os.makedirs(work_dir, exist_ok=True)
+    git_version = subprocess.run(["git", "--version"], stdout=subprocess.PIPE, text=True).stdout.strip()
+    results = {
+        "hook_revision": get_hook_revision(hook_path),
+        "python": platform.python_version(),
+        "git": git_version.replace("git version ", ""),
+        "platform": platform.platform(),
+        "cases": [],
+    }
+    try:
+        for file_count in arguments.files.split(","):
+            case = {
+                "files": int(file_count),
+                "depth": arguments.depth,
+                "files_per_namespace": arguments.files_per_namespace,
+                "fan_out": arguments.fan_out,
+                "cycles": arguments.cycles,
+                "push_size": arguments.push_size,
+                "push_change": arguments.push_change,
+                "root_fraction": arguments.root_fraction,
+                "seed": arguments.seed,
+                "root_directory": BENCH_DEFAULTS["ROOT_DIRECTORY"],
+                "namespace_path": BENCH_DEFAULTS["NAMESPACE_PATH"],
+            }
+            print(f'benchmarking {case["files"]} files ...', file=sys.stderr)
+            results["cases"].append(benchmark_case(hook_path, work_dir, case, arguments.runs))
+    finally:
+        # throwaway repositories go unless asked to keep them
+        if not arguments.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if arguments.output:
+        with open(arguments.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+    print_results(results, baseline)
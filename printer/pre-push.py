@@ -1,12 +1,16 @@
-import sys, os, re, time
-from datetime import datetime
+import sys, os, re, time, subprocess, posixpath
+from collections import namedtuple
+# everything else (sqlite3, json, socket, threading ...) is imported
+# by the functions using it: a push the pathspec check settles never
+# pays for those imports
 
 """
 A global dictionary of constants
 """
 CONSTANTS = {
     "ISO_FORMAT_REGEX"       : r'\d+-\d+-\d+\s+\d+:\d+:\d+', # e.g. '2019-12-20 6:56:00'
-    "EDGEZONERP_BUILD_CMD"   : "ls -al", # "dotnet restore build.proj | dotnet build build.proj",
+    "EDGEZONERP_BUILD_CMD"   : "ls -al", # "dotnet build build.proj --no-restore",
+    "EDGEZONERP_RESTORE_CMD" : "", # "dotnet restore build.proj", "" == no separate restore step
     "PY_DATETIME_FORMAT"     : "%Y-%m-%d %H:%M:%S", # e.g. '2019-12-20 6:56:00'
     "DELETE_PUSH_HASH_VALUE" : "0000000000000000000000000000000000000000",
     "ROOT_DIRECTORIES"       : ["test"], # ["Controllers", "Attributes"],
@@ -15,9 +19,475 @@ CONSTANTS = {
     "DELETE_PUSH_REF_VALUE"  : "(delete)",
     "EDGEZONERP"             : "EdgeZoneRP",
     "SWAGGER_FILE_NAME"      : "swagger",
-    "ROOT_DIR_DELIM"         : "."
+    "ROOT_DIR_DELIM"         : ".",
+    "DEPENDENCY_INDEX_FILE"  : "pre-push-dependencies.sqlite", # stored under .git/
+    "DEPENDENCY_INDEX_SCHEMA": 6,
+    "READ_CHUNK_SIZE"        : 8192, # bytes read at a time while parsing headers
+    "DAEMON_SOCKET_FILE"     : "pre-push-daemon.sock", # stored under .git/
+    "DAEMON_TIMEOUT_SECONDS" : 10, # the hook falls back in-process after this
+    "DAEMON_CACHED_COMMITS"  : 8, # commits whose trees/namespace tries the daemon keeps
+    "ANALYSIS_SOURCE"        : "objects", # "objects" (pushed commit) or "worktree"
+    "BUILD_CACHE_FILE"       : "pre-push-builds.sqlite", # stored under .git/
+    "BUILD_CACHE_SIZE"       : 64, # successful builds remembered (least recently used go)
+    "BUILD_CACHE_PATHS"      : [], # build relevant paths, [] == the whole tree
+    "TARGETED_BUILDS"        : True, # build only the affected projects when they are known
+    "PROJECT_FILE_PATTERN"   : "*.csproj",
+    "BUILD_INPUT_FILES"      : ["build.proj", "Directory.Build.*", "*.props", "*.targets",
+                                "global.json", "NuGet.config"], # outside every project: build everything
+    "PROJECT_BUILD_CMD"      : "ls -al {project}", # "dotnet build {project} --no-restore",
+    "PROJECT_RESTORE_CMD"    : "", # "dotnet restore {project}", "" == no separate restore step
+    "BUILD_JOBS"             : os.cpu_count() or 1, # build steps run at the same time
+    "BUILD_TIMEOUT_SECONDS"  : 900, # the whole build is stopped after this, 0 == no limit
+    "ABORT_PUSH_ON_FAILURE"  : False, # exit with the failed build's status (git then aborts the push)
+    "VERDICT_NOTES_REF"      : "refs/notes/pre-push-verdicts", # recorded verdicts, "" == off
+    "SWAGGER_SURFACE_DIFF"   : True, # a stale swagger date alone is no rebuild when the surface is unchanged
+    "PRUNE_DIRECTORIES"      : ["bin", "obj", "packages", "node_modules"], # never walked (nor gitignored dirs)
+    "HUNK_FILTER"            : True, # comment/whitespace only edits of the API files need no rebuild
+    "DECISION_MODE"          : "heuristic", # "heuristic" (reflog/mtime) or "range" (see evaluate_push_range)
+    "PATHSPEC_FAST_PATH"     : True, # settle pushes touching no API path with one git diff per ref
+    "DECISION_BUDGET_SECONDS": 30, # past it the push is rebuilt and analysed in the background, 0 == no limit
+    "WARM_LOCK_FILE"         : "pre-push-warm.lock", # stored under .git/, one background analysis at a time
+    "WARM_LOCK_SECONDS"      : 600 # an older lock is taken as left behind by a dead analysis
 }
 
+"""
+CONSTANTS as configured, before the hook adds the paths
+it finds at run time (REPO_BASE_DIR, EXTENSIONS_BASE_DIR)
+"""
+CONFIGURED_CONSTANTS = dict(CONSTANTS)
+
+"""
+Patterns compiled once for the 'using' parser
+"""
+DEPENDENCY_PATTERN = re.compile(CONSTANTS["DEPENDENCY_REGEX"])
+# comments, string and char literals, in the order they can open
+COMMENT_OR_STRING_PATTERN = re.compile(r'//|/\*|[$@]*"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])+\'')
+# using X; | using static X; | using Alias = X; | global using X;
+USING_DIRECTIVE_PATTERN = re.compile(
+    r'^(?:global\s+)?using\s+(?:static\s+)?(?:\w+\s*=\s*)?(?P<target>[\w.]+)\s*$')
+# the first of these ends the 'using' section of a C# file
+DECLARATION_PATTERN = re.compile(
+    r'^(?:namespace|class|interface|struct|enum|record|delegate|public|'
+    r'internal|private|protected|abstract|sealed|static|partial|unsafe)\b')
+# what namespace declarations are tracked by: the keyword and the braces
+NAMESPACE_TOKEN_PATTERN = re.compile(r'\bnamespace\s+(?P<name>[\w.]+)|[{};]')
+# a changed line that may continue a /* */ block opened above its hunk: '* text', '*', '*/'
+COMMENT_CONTINUATION_PATTERN = re.compile(r'^\*(?:\s|/|$)')
+# the start lines of both sides of a diff hunk
+HUNK_HEADER_PATTERN = re.compile(r'^@@ -(?P<old>\d+)(?:,\d+)? \+(?P<new>\d+)(?:,\d+)? @@')
+# editor only preprocessor lines
+REGION_PATTERN = re.compile(r'^#\s*(?:region|endregion)\b')
+# one JSON token (strings keep their escapes) for the swagger surface
+JSON_TOKEN_PATTERN = re.compile(
+    r'\s*(?:"(?P<string>[^"\\]*(?:\\.[^"\\]*)*)"|(?P<punctuation>[{}\[\]:,])'
+    r'|(?P<scalar>-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?|true|false|null))')
+
+"""
+Cache of directory listings shared by every walk
+dir_path -> {entry name: os.DirEntry} (DirEntry caches its type)
+"""
+DIRECTORY_LISTINGS = {}
+
+"""
+Directory listings read from git trees instead of the disk
+commit -> {dir_path: {entry name: GitTreeEntry}}
+"""
+TREE_LISTINGS = {}
+
+"""
+Cache of single-pass repository scans
+(search_base_dir, analysis commit) -> {"swagger_file_path": str, "root_dirs": list}
+"""
+REPOSITORY_SCANS = {}
+
+"""
+Results of git probes shared by every ref of one push
+(probe name, *arguments) -> result
+"""
+PROBE_RESULTS = {}
+
+"""
+One '<local_ref> <local_oid> <remote_ref> <remote_oid>' push line
+"""
+PushRef = namedtuple("PushRef", ["local_ref", "local_oid", "remote_ref", "remote_oid"])
+
+"""
+One 'git diff/log -z --name-status' record: status letter,
+path and, for renames/copies, the source path ... log's
+commit headers come through as status "commit" with the
+'<commit> <parents>' header as path
+"""
+NameStatusRecord = namedtuple("NameStatusRecord", ["status", "path", "source_path"])
+
+"""
+Cache of dependency graphs, one per push
+(analysis commit, frozenset(files_to_be_pushed paths)) -> DependencyGraph
+"""
+DEPENDENCY_GRAPHS = {}
+
+"""
+Cache of namespace declaration tries
+analysis commit -> NamespaceTrie
+"""
+NAMESPACE_TRIES = {}
+
+"""
+Cache of the hunk filter's answer for one file change
+(old blob id, new blob id) -> True when code changed
+"""
+HUNK_RELEVANCE = {}
+
+"""
+The budget of the rebuild decision (seconds, 0 == no limit),
+the deadline of the running one (perf_counter value, None ==
+no budget), the stage it has reached and the number of refs
+it has decided
+"""
+DECISION_DEADLINE = {"budget": CONSTANTS["DECISION_BUDGET_SECONDS"], "expires": None,
+                     "stage": None, "decided_refs": 0}
+
+"""
+The state of the ref being analysed: the decision mode in
+effect, the commit whose tree the walks read (None == the
+working tree) and its (remote_oid, local_oid) push range
+"""
+ANALYSIS_STATE = {"decision_mode": CONSTANTS["DECISION_MODE"], "commit": None,
+                  "push_range": None}
+
+"""
+The persistent dependency index (opened lazily)
+"""
+DEPENDENCY_INDEX = None
+
+"""
+The long-lived 'git cat-file --batch' reader (started lazily)
+"""
+GIT_BLOB_READER = None
+
+"""
+The cache of successful builds (opened lazily)
+"""
+BUILD_CACHE = None
+
+
+"""
+Per-phase tracing of the hook (--trace or PRE_PUSH_TRACE)
+A. wall time of every phase (see the traced decorator)
+B. number and total wall time of the subprocesses started,
+   by timing every subprocess.Popen while tracing is on
+C. counters: directories/files visited, dependency depth
+D. every build step (see run_build_steps), one row per job
+The result is printed as a summary, or written as JSON or
+as a Chrome trace (chrome://tracing, Perfetto)
+"""
+class Tracer:
+    def __init__(self):
+        self.enabled = False
+        self.output_path = None # None == print a summary
+        self.output_format = "json" # or "chrome"
+        self.started = time.perf_counter()
+        self.events = [] # (category, name, start, duration, args)
+        self.phases = {} # name -> [calls, total seconds]
+        self.counters = {} # name -> int
+        self.subprocesses = {} # Popen -> (start, command)
+
+    """
+    Method turns tracing on and starts timing every
+    subprocess the hook (or git/asyncio helpers) starts
+    param: output_path (str) or None for a summary
+    param: output_format (str) "json" or "chrome"
+    """
+    def enable(self, output_path=None, output_format="json"):
+        self.enabled = True
+        self.output_path = output_path
+        self.output_format = output_format
+        self.started = time.perf_counter()
+        tracer = self
+
+        class TracedPopen(subprocess.Popen):
+            def __init__(self, *args, **kwargs):
+                started = time.perf_counter()
+                super().__init__(*args, **kwargs)
+                command = args[0] if args else kwargs.get("args")
+                tracer.subprocesses[self] = (started, command)
+
+            def wait(self, timeout=None):
+                returncode = super().wait(timeout)
+                tracer.finish_subprocess(self)
+                return returncode
+
+        subprocess.Popen = TracedPopen
+
+    """
+    Method records the end of a traced subprocess
+    param: process (subprocess.Popen)
+    """
+    def finish_subprocess(self, process):
+        started, command = self.subprocesses.pop(process, (None, None))
+        if started is not None:
+            if not isinstance(command, str):
+                command = " ".join(str(argument) for argument in command)
+            self.add_event("subprocess", command.split(" ")[0] if command else "?",
+                           started, time.perf_counter() - started, {"command": command})
+
+    """
+    Method records one finished event (phase/subprocess/...)
+    param: category (str)
+    param: name (str)
+    param: started (float perf_counter)
+    param: duration (float seconds)
+    param: args (dict) extra information
+    """
+    def add_event(self, category, name, started, duration, args=None):
+        if not self.enabled:
+            return
+        self.events.append((category, name, started, duration, args or {}))
+        if category == "phase":
+            phase = self.phases.setdefault(name, [0, 0.0])
+            phase[0] += 1
+            phase[1] += duration
+
+    """
+    Method adds to a counter
+    param: name (str)
+    param: amount (int)
+    """
+    def count(self, name, amount=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    """
+    Method keeps the maximum seen for a counter
+    param: name (str)
+    param: value (int)
+    """
+    def record_max(self, name, value):
+        if self.enabled and value > self.counters.get(name, 0):
+            self.counters[name] = value
+
+    """
+    Method returns the collected data as a dict
+    return: (dict) phases, subprocesses and counters
+    """
+    def get_report(self):
+        subprocess_events = [event for event in self.events if event[0] == "subprocess"]
+        build_events = [event for event in self.events if event[0] == "build"]
+        return {
+            "total_seconds": time.perf_counter() - self.started,
+            "phases": {name: {"calls": calls, "seconds": seconds}
+                       for name, (calls, seconds) in self.phases.items()},
+            "subprocesses": {"count": len(subprocess_events) + len(self.subprocesses),
+                             "seconds": sum(event[3] for event in subprocess_events),
+                             "still_running": len(self.subprocesses)},
+            "builds": {name: {"seconds": duration, "exit_status": args.get("exit_status")}
+                       for _, name, _, duration, args in build_events},
+            "counters": dict(self.counters),
+        }
+
+    """
+    Method writes/prints the trace, once, at exit
+    """
+    def finish(self):
+        import json
+        if not self.enabled:
+            return
+        self.enabled = False
+        report = self.get_report()
+        if self.output_path and self.output_format == "chrome":
+            trace_events = [{"name": name, "cat": category, "ph": "X", "pid": os.getpid(),
+                             # phases, subprocesses, then one row per build job
+                             "tid": {"phase": 0, "subprocess": 1}.get(category,
+                                                                      2 + args.get("job", 0)),
+                             "ts": (started - self.started) * 1e6, "dur": duration * 1e6,
+                             "args": args}
+                            for category, name, started, duration, args in self.events]
+            trace_events.extend({"name": name, "ph": "C", "pid": os.getpid(), "ts": 0,
+                                 "args": {name: value}}
+                                for name, value in report["counters"].items())
+            with open(self.output_path, "w") as output_file:
+                json.dump({"traceEvents": trace_events}, output_file)
+        elif self.output_path:
+            report["events"] = [{"category": category, "name": name,
+                                 "start": started - self.started, "seconds": duration,
+                                 "args": args}
+                                for category, name, started, duration, args in self.events]
+            with open(self.output_path, "w") as output_file:
+                json.dump(report, output_file, indent=2)
+        else:
+            lines = [f'pre-push trace: {report["total_seconds"] * 1000:.1f} ms total']
+            for name, phase in sorted(report["phases"].items(),
+                                      key=lambda item: -item[1]["seconds"]):
+                lines.append(f'  {name:<32} {phase["seconds"] * 1000:9.1f} ms'
+                             f'  ({phase["calls"]} calls)')
+            lines.append(f'  {"subprocesses":<32} {report["subprocesses"]["seconds"] * 1000:9.1f} ms'
+                         f'  ({report["subprocesses"]["count"]} started)')
+            for name, build in report["builds"].items():
+                lines.append(f'  {name:<32} {build["seconds"] * 1000:9.1f} ms'
+                             f'  (exit status {build["exit_status"]})')
+            for name, value in sorted(report["counters"].items()):
+                lines.append(f'  {name:<32} {value:9}')
+            print("\n".join(lines), file=sys.stderr)
+
+"""
+The hook's tracer (disabled unless asked for)
+"""
+TRACER = Tracer()
+
+
+"""
+Decorator timing every call of a function as a
+trace phase ... costs one attribute check when
+tracing is off
+param: phase_name (str)
+"""
+def traced(phase_name):
+    def decorator(function):
+        def traced_function(*args, **kwargs):
+            if not TRACER.enabled:
+                return function(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                TRACER.add_event("phase", phase_name, started, time.perf_counter() - started)
+        traced_function.__name__ = function.__name__
+        traced_function.__doc__ = function.__doc__
+        return traced_function
+    return decorator
+
+
+"""
+Function reads the hook's own options from the command line
+(and removes them, git never passes them) or from the
+environment, in one pass before the push arguments are read ...
+--trace | PRE_PUSH_TRACE=1            summary on stderr
+--trace=FILE | PRE_PUSH_TRACE=FILE    JSON report in FILE
+--trace-format=chrome | PRE_PUSH_TRACE_FORMAT=chrome
+                                      Chrome trace in FILE instead
+--profile=FILE | PRE_PUSH_PROFILE=FILE  cProfile dump in FILE
+--decision-mode=range | PRE_PUSH_DECISION_MODE=range
+                                      overrides CONSTANTS["DECISION_MODE"]
+--decision-budget=SECONDS | PRE_PUSH_DECISION_BUDGET=SECONDS
+                                      overrides CONSTANTS["DECISION_BUDGET_SECONDS"]
+return: profile output path (str) or None
+"""
+def configure_options():
+    options = {
+        "--trace":           os.environ.get("PRE_PUSH_TRACE"),
+        "--trace-format":    os.environ.get("PRE_PUSH_TRACE_FORMAT", "json"),
+        "--profile":         os.environ.get("PRE_PUSH_PROFILE"),
+        "--decision-mode":   os.environ.get("PRE_PUSH_DECISION_MODE"),
+        "--decision-budget": os.environ.get("PRE_PUSH_DECISION_BUDGET")
+    }
+    remaining_args = [sys.argv[0]]
+    for argument in sys.argv[1:]:
+        option, _, value = argument.partition("=")
+        if option == "--trace":
+            options[option] = value or "1"
+        elif option in options:
+            options[option] = value
+        else:
+            remaining_args.append(argument)
+    sys.argv[:] = remaining_args
+
+    trace = options["--trace"]
+    if trace and trace.lower() not in ("0", "false", "no", "off"):
+        output_path = None if trace.lower() in ("1", "true", "yes", "on", "summary") else trace
+        TRACER.enable(output_path, options["--trace-format"])
+
+    if options["--decision-mode"] in ("heuristic", "range"):
+        ANALYSIS_STATE["decision_mode"] = options["--decision-mode"]
+
+    decision_budget = options["--decision-budget"]
+    try:
+        if decision_budget is not None and float(decision_budget) >= 0:
+            DECISION_DEADLINE["budget"] = float(decision_budget)
+    except ValueError:
+        pass
+    return options["--profile"] or None
+
+
+"""
+Raised at a deadline checkpoint once the decision budget
+is spent, with the stage the decision had reached
+"""
+class DeadlineExceeded(Exception):
+    pass
+
+
+"""
+Raised when the dependency index fails while the decision
+reads it (locked, corrupt): the index is dropped and the
+push gets the conservative rebuild
+"""
+class DependencyIndexError(Exception):
+    pass
+
+
+"""
+Function starts the clock of the rebuild decision
+(DECISION_BUDGET_SECONDS from now, 0 == no limit)
+"""
+def start_decision_deadline():
+    budget = DECISION_DEADLINE["budget"]
+    DECISION_DEADLINE["expires"] = time.perf_counter() + budget if budget else None
+    DECISION_DEADLINE["stage"] = None
+    DECISION_DEADLINE["decided_refs"] = 0
+
+
+"""
+Function stops the clock: whatever runs after the
+decision (the build, recording it) is not bounded
+"""
+def stop_decision_deadline():
+    DECISION_DEADLINE["expires"] = None
+
+
+"""
+Function is the deadline checkpoint of the decision's
+loops (one per file, dir, commit or dependency node) ...
+a comparison when there is time left, so it costs
+nothing worth measuring
+"""
+def check_deadline():
+    expires = DECISION_DEADLINE["expires"]
+    if expires is not None and time.perf_counter() > expires:
+        raise DeadlineExceeded(DECISION_DEADLINE["stage"])
+
+
+"""
+Function marks the start of the next decision stage
+(cheapest first: pathspec check, swagger check, direct
+hits, dependency closure) and checks the deadline
+param: stage (str) as reported when the budget runs out
+"""
+def enter_decision_stage(stage):
+    DECISION_DEADLINE["stage"] = stage
+    check_deadline()
+
+
+"""
+Function returns the time left of the decision budget
+return: seconds (float), None when there is no limit
+"""
+def get_deadline_remaining():
+    expires = DECISION_DEADLINE["expires"]
+    if expires is None:
+        return None
+    return max(0.0, expires - time.perf_counter())
+
+
+"""
+Function waits for threads (the startup probes) no
+longer than the decision budget allows
+param: threads (list of threading.Thread)
+"""
+def join_before_deadline(threads):
+    for thread in threads:
+        thread.join(get_deadline_remaining())
+        if thread.is_alive():
+            raise DeadlineExceeded(DECISION_DEADLINE["stage"])
+
 
 """
 Function simply formats date in ISO format
@@ -28,6 +498,7 @@ param: unformatted date (str in git ISO datetime)
 return: python datetime object
 """
 def get_formatted_datetime(unformatted_date):
+    from datetime import datetime
     if not unformatted_date: # None or empty
         return None
 
@@ -50,12 +521,17 @@ push date on the current branch. It scans the
 output of git reflog to attempt to find this
 return: date (python datetime object)
 """
+@traced("reflog_push_date")
 def get_most_recent_push_datetime():
+    # the reflog does not change between the refs of one push
+    if "reflog_push_datetime" in PROBE_RESULTS:
+        return PROBE_RESULTS["reflog_push_datetime"]
     search_str = "findstr checkout" if "win" in sys.platform else "grep checkout"
     push_date_stream = os.popen(f'git reflog --date=iso | {search_str}')
     push_date_str = push_date_stream.readline() # gets most recent push from log
     # returns format '2019-12-20 6:56:00'
     most_recent_global_push_date = get_formatted_datetime(push_date_str) 
+    PROBE_RESULTS["reflog_push_datetime"] = most_recent_global_push_date
     return most_recent_global_push_date
 
 
@@ -72,12 +548,20 @@ to the implementation of the API action methods
 Assumption: Each new build may update this file
 param: swagger_file_path (str)
 """
+@traced("swagger_modified_date")
 def get_swagger_modified_datetime(swagger_file_path):
-    if not swagger_file_path:
-        return None
-    modified_date = os.path.getmtime(swagger_file_path)
-    datetime_struct = time.strptime(time.ctime(modified_date))
-    most_recent_modification_datetime = datetime.fromtimestamp(time.mktime(datetime_struct))
+    from datetime import datetime
+    # stat once per push (the startup probes may have done it already)
+    probe_key = ("swagger_modified_datetime", swagger_file_path)
+    if probe_key in PROBE_RESULTS:
+        return PROBE_RESULTS[probe_key]
+    most_recent_modification_datetime = None
+    # the spec may only exist in the pushed commit (bare repo/CI)
+    if swagger_file_path and os.path.isfile(swagger_file_path):
+        modified_date = os.path.getmtime(swagger_file_path)
+        datetime_struct = time.strptime(time.ctime(modified_date))
+        most_recent_modification_datetime = datetime.fromtimestamp(time.mktime(datetime_struct))
+    PROBE_RESULTS[probe_key] = most_recent_modification_datetime
     return most_recent_modification_datetime
 
 
@@ -85,22 +569,13 @@ def get_swagger_modified_datetime(swagger_file_path):
 Function explores all files in this dir
 to see if any of these files need to be modified
 param: dir_path (str)
-param: files_to_be_pushed (set of files to be pushed)
+param: files_to_be_pushed (PathTrie of files to be pushed)
 return: boolean
 """
 def is_dir_and_dependencies_to_be_pushed(dir_path, files_to_be_pushed):
-    # loop through all the items in the dir_path
-    for entry in os.listdir(dir_path):
-        entry_path = f'{dir_path}\\{entry}' # could be a file/dir
-        if not os.path.islink(entry_path) and not entry.startswith("."):
-            result = False
-            if os.path.isdir(entry_path):
-                result = is_dir_and_dependencies_to_be_pushed(entry_path, files_to_be_pushed)
-            elif os.path.isfile(entry_path):
-                result = is_file_and_dependencies_to_be_pushed(entry, entry_path, files_to_be_pushed)
-            if result:
-                return result
-    return False
+    # a dir node's edges are its entries, so this covers the whole subtree
+    dependency_graph = get_dependency_graph(files_to_be_pushed)
+    return dependency_graph.reaches_pushed_file(dir_path)
 
 
 """
@@ -108,17 +583,278 @@ Function explores all files in this dir
 to see if any of these files need to be modified
 param: filename (str)
 param: file_path (str)
-param: files_to_be_pushed (set of files to be pushed)
+param: files_to_be_pushed (PathTrie of files to be pushed)
 return: boolean
 """
 def is_file_and_dependencies_to_be_pushed(filename, file_path, files_to_be_pushed):
-    # check to see if file is in files_to_be_pushed
-    if filename in files_to_be_pushed:
+    # check to see if file is in files_to_be_pushed (full path, not just filename)
+    if get_git_relative_path(file_path) in files_to_be_pushed:
         return True
     # return result from exploring file dependencies
     return explore_dependencies(file_path, files_to_be_pushed)
 
 
+"""
+Function converts a path built by this script
+into the repo-relative, '/' separated form that
+git prints and accepts as a pathspec ...
+param: path (str)
+return: git_path (str)
+"""
+def get_git_relative_path(path):
+    native_path = path.replace("\\", os.sep)
+    native_base = CONSTANTS["REPO_BASE_DIR"].replace("\\", os.sep)
+    relative_path = os.path.relpath(native_path, native_base)
+    return relative_path.replace(os.sep, "/")
+
+
+"""
+Function runs a git command from the repository base
+directory and returns its output lines ...
+param: args (list of git arguments)
+param: check (boolean) return None when git fails
+return: (list) of lines (str) or None
+"""
+def read_git_lines(args, check=False):
+    result = subprocess.run(["git", "-c", "core.quotePath=false", *args],
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                            text=True, cwd=CONSTANTS["REPO_BASE_DIR"])
+    if check and result.returncode != 0:
+        return None
+    return [line for line in result.stdout.splitlines() if line]
+
+
+"""
+Function converts a python datetime object
+into integer seconds since the epoch so that
+commit dates can be compared cheaply ...
+param: datetime_object (python datetime object)
+return: epoch (int) or None
+"""
+def get_epoch_seconds(datetime_object):
+    if not datetime_object:
+        return None
+    return int(datetime_object.timestamp())
+
+
+"""
+Function resolves the most recent commit time
+of every entry of every root directory with a
+single streaming git history walk, instead of
+one 'git log -n 1' process per entry ...
+1. git log prints commits newest first, so the first
+   time an entry shows up is its most recent commit
+2. reading stops as soon as every entry is resolved
+param: root_dirs [list of primary paths]
+return: (dict) entry_path -> commit epoch (int)
+"""
+@traced("git_log_commit_dates")
+def get_latest_commit_epochs(root_dirs):
+    revision = ANALYSIS_STATE["commit"] or "HEAD"
+    probe_key = ("latest_commit_epochs", tuple(root_dirs), revision)
+    if probe_key in PROBE_RESULTS:
+        return PROBE_RESULTS[probe_key]
+    # map the git form of every entry back to the path we report on
+    pending_entries = {}
+    git_roots = []
+    for root_dir in root_dirs:
+        git_root = get_git_relative_path(root_dir)
+        git_roots.append(git_root)
+        for entry in list_directory(root_dir).values():
+            pending_entries[f'{git_root}/{entry.name}'] = entry.path
+
+    latest_commit_epochs = {}
+    PROBE_RESULTS[probe_key] = latest_commit_epochs
+    if not pending_entries:
+        return latest_commit_epochs
+
+    # NUL marks the commit lines so they never clash with file names
+    command = ["git", "-c", "core.quotePath=false", "log", "--name-only",
+               "--format=%x00%ct", revision, "--", *git_roots]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE,
+                               stderr=subprocess.DEVNULL, text=True,
+                               cwd=CONSTANTS["REPO_BASE_DIR"])
+    commit_epoch = None
+    try:
+        for line in process.stdout:
+            line = line.rstrip("\n")
+            if line.startswith("\0"):
+                check_deadline()
+                commit_epoch = int(line[1:])
+                continue
+            if not line or commit_epoch is None:
+                continue
+            # reduce 'root/entry/any/depth' down to 'root/entry'
+            for git_root in git_roots:
+                if line.startswith(f'{git_root}/'):
+                    entry = line[len(git_root) + 1:].split("/", 1)[0]
+                    entry_path = pending_entries.pop(f'{git_root}/{entry}', None)
+                    if entry_path:
+                        latest_commit_epochs[entry_path] = commit_epoch
+                    break
+            # every entry resolved so the rest of history is irrelevant
+            if not pending_entries:
+                break
+    except DeadlineExceeded:
+        del PROBE_RESULTS[probe_key] # not every entry resolved
+        raise
+    finally:
+        process.stdout.close()
+        process.kill()
+        process.wait()
+    return latest_commit_epochs
+
+
+"""
+Function splits a JSON document (given as byte chunks) into
+tokens without holding more than the current token ...
+a token touching the end of the buffer waits for the next
+chunk, it may go on there
+param: chunks (iterable of bytes)
+return: generator of (kind, text): kind is "punctuation",
+        "string" (escapes left in) or "scalar"
+"""
+def iter_json_tokens(chunks):
+    import codecs
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    chunks = iter(chunks)
+    buffer = ""
+    at_end = False
+    while not at_end:
+        chunk = next(chunks, None)
+        at_end = chunk is None
+        buffer += decoder.decode(chunk or b"", final=at_end)
+        position = 0
+        while True:
+            match = JSON_TOKEN_PATTERN.match(buffer, position)
+            if not match or (match.end() == len(buffer) and not at_end):
+                break
+            position = match.end()
+            yield match.lastgroup, match.group(match.lastgroup)
+        buffer = buffer[position:]
+    if buffer.strip():
+        raise ValueError(f'not JSON: {buffer[:40]!r}')
+
+
+"""
+Keys whose values only document the API (skipped by the
+swagger surface) and keys whose members are names instead
+(properties, schemas ...), where no key is skipped
+"""
+SWAGGER_DOCUMENTATION_KEYS = {"description", "summary", "example", "examples", "externalDocs", "info"}
+SWAGGER_NAME_MAP_KEYS = {"paths", "definitions", "schemas", "properties", "parameters", "responses",
+                         "headers", "securityDefinitions", "securitySchemes", "patternProperties",
+                         "components", "requestBodies", "callbacks", "links", "content"}
+SWAGGER_OPERATIONS = {"get", "put", "post", "delete", "options", "head", "patch", "trace", "parameters"}
+
+
+"""
+Function reads a swagger/OpenAPI spec (JSON, as byte chunks)
+in a single streaming pass and returns its API surface: a
+digest per operation ('paths' -> path -> method), per schema
+('definitions' or 'components' -> kind -> name) and per other
+top level key ... digests ignore the order of object keys and
+the documentation only keys. Only one list of member digests
+per open object/array is kept, never the spec itself
+param: chunks (iterable of bytes)
+return: (dict) surface key (tuple) -> digest (bytes)
+"""
+def get_swagger_surface(chunks):
+    import hashlib, json
+    surface = {}
+    # one frame per open object/array: [is object, key path, member digests, pending key]
+    stack = []
+    root_seen = False
+
+    def add_value(digest):
+        nonlocal root_seen
+        if not stack:
+            root_seen = True
+            return
+        frame = stack[-1]
+        if not frame[0]:
+            frame[2].append(digest)
+            return
+        key, frame[3] = frame[3], None
+        key_path = frame[1] + (key,)
+        if frame[1][-1:] and frame[1][-1] in SWAGGER_NAME_MAP_KEYS or key not in SWAGGER_DOCUMENTATION_KEYS:
+            frame[2].append(hashlib.sha1(key.encode() + b"\0" + digest).digest())
+        # the surface entries
+        if len(key_path) == 3 and key_path[0] == "paths" and key_path[2] in SWAGGER_OPERATIONS:
+            surface[("operation", key_path[1], key_path[2])] = digest
+        elif len(key_path) == 2 and key_path[0] == "definitions":
+            surface[("schema", key_path[1])] = digest
+        elif len(key_path) == 3 and key_path[0] == "components":
+            surface[("schema" if key_path[1] == "schemas" else key_path[1], key_path[2])] = digest
+        elif len(key_path) == 1 and key_path[0] not in ("paths", "definitions", "components",
+                                                       *SWAGGER_DOCUMENTATION_KEYS):
+            surface[("spec", key_path[0])] = digest
+
+    for kind, text in iter_json_tokens(chunks):
+        if root_seen:
+            raise ValueError("more than one JSON value")
+        if kind == "string":
+            if "\\" in text:
+                text = json.loads(f'"{text}"')
+            if stack and stack[-1][0] and stack[-1][3] is None:
+                stack[-1][3] = text # an object key
+            else:
+                add_value(hashlib.sha1(b"s" + text.encode()).digest())
+        elif kind == "scalar":
+            add_value(hashlib.sha1(b"v" + text.encode()).digest())
+        elif text in "{[":
+            key_path = ()
+            if stack:
+                parent = stack[-1]
+                key_path = parent[1] + ((parent[3],) if parent[0] else ("[]",))
+            stack.append([text == "{", key_path, [], None])
+        elif text in "}]":
+            if not stack or stack[-1][0] != (text == "}"):
+                raise ValueError("unbalanced JSON")
+            is_object, _, digests, _ = stack.pop()
+            if is_object:
+                digests.sort() # key order carries no meaning
+            add_value(hashlib.sha1((b"{" if is_object else b"[") + b"".join(digests)).digest())
+        # ':' and ',' carry nothing the frames do not know already
+    if stack or not root_seen:
+        raise ValueError("truncated JSON")
+    return surface
+
+
+"""
+Function tells whether the API surface of the swagger spec
+(see get_swagger_surface) differs between the remote and the
+pushed commit of the ref being analysed ... the spec is
+streamed from git, never checked out
+return: (boolean) or None when unknown (no remote commit, no
+        spec on either side, or a spec that is not JSON)
+"""
+@traced("swagger_surface")
+def is_swagger_surface_pushed():
+    if not CONSTANTS["SWAGGER_SURFACE_DIFF"] or not ANALYSIS_STATE["push_range"]:
+        return None
+    remote_oid, local_oid = ANALYSIS_STATE["push_range"]
+    swagger_file_path = get_swagger_file_path()
+    if remote_oid == CONSTANTS["DELETE_PUSH_HASH_VALUE"] or not swagger_file_path:
+        return None
+    swagger_path = get_git_relative_path(swagger_file_path)
+    surfaces = []
+    for commit in (remote_oid, local_oid):
+        probe_key = ("swagger_surface", commit, swagger_path)
+        if probe_key not in PROBE_RESULTS:
+            blob_chunks = get_git_blob_reader().iter_blob_chunks(f'{commit}:{swagger_path}')
+            try:
+                PROBE_RESULTS[probe_key] = get_swagger_surface(blob_chunks)
+            except ValueError:
+                PROBE_RESULTS[probe_key] = None
+            finally:
+                blob_chunks.close()
+        surfaces.append(PROBE_RESULTS[probe_key])
+    if None in surfaces:
+        return None
+    return surfaces[0] != surfaces[1]
+
+
 """
 Loops through selected repositories
 ----- API related directories -----
@@ -127,6 +863,7 @@ last push and then enforces a build before
 pushing up to ADO
 @param: root_dirs [list of primary paths]
 """
+@traced("check_api_committed_changes")
 def check_for_api_committed_changes(root_dirs,
                                     swagger_most_recent_mod, 
                                     global_most_recent_push,
@@ -137,50 +874,78 @@ def check_for_api_committed_changes(root_dirs,
     
     # boolean to keep track of whether we should rebuild project
     rebuild = False
-    files_to_be_pushed_not_empty = len(files_to_be_pushed) == 0
+    files_to_be_pushed_not_empty = len(files_to_be_pushed) != 0
+    impacted_entries = None # reverse dependency answer, computed on demand
+    impact_query_attempted = False
+
+    # all comparisons below are done on integer epochs
+    swagger_mod_epoch = get_epoch_seconds(swagger_most_recent_mod)
+    global_push_epoch = get_epoch_seconds(global_most_recent_push)
+    enter_decision_stage("commit dates")
+    latest_commit_epochs = get_latest_commit_epochs(root_dirs)
 
+    # the entries the pushed files are checked against (below), a
+    # pushed file right inside one is the cheapest answer there
+    candidate_entries = None
+    if not global_push_epoch and files_to_be_pushed_not_empty:
+        candidate_entries = {entry.path for root_dir in root_dirs
+                             for entry in list_directory(root_dir).values()
+                             if latest_commit_epochs.get(entry.path) is not None
+                             and not entry.is_symlink()}
+
+    enter_decision_stage("swagger check")
     # loop through relevant dirs and sub-dirs to check
     for root_dir in root_dirs:
         # check every sub-dir ...
-        for entry in os.listdir(root_dir):
-            entry_path = f'{root_dir}\\{entry}' # could be a file/dir
+        for entry in list_directory(root_dir).values():
+            entry_path = entry.path # could be a file/dir
             # print(entry_path)
             # get the most recent commit date
-            commit_date_stream = os.popen(f'git log -n 1 --date=iso --pretty=format:%cd {entry_path}')
-            commit_date = commit_date_stream.readline().strip()
-            # print(commit_date)
-            if not commit_date:
-                continue
-
-            # otherwise implement logic defined in function comments
-            most_recent_commit_dt = get_formatted_datetime(commit_date)
-            if not most_recent_commit_dt:
+            most_recent_commit_epoch = latest_commit_epochs.get(entry_path)
+            if most_recent_commit_epoch is None:
                 continue
 
             # API definition changes check ... 
-            if swagger_most_recent_mod and most_recent_commit_dt > swagger_most_recent_mod:
-                # print("swagger_most_recent_mod")
-                rebuild = True
-                break
+            if swagger_mod_epoch and most_recent_commit_epoch > swagger_mod_epoch:
+                # the same swagger surface before and after the push needs
+                # no rebuild for it (the push date check below still runs)
+                if is_swagger_surface_pushed() is not False:
+                    # print("swagger_most_recent_mod")
+                    rebuild = True
+                    break
             
             # condition == True means unpushed commits exist, rebuild project
             # This is more focussed on API implementation changes within repo
-            if global_most_recent_push:
-                if most_recent_commit_dt > global_most_recent_push:
+            if global_push_epoch:
+                if most_recent_commit_epoch > global_push_epoch:
                     # print("global_most_recent_push")
                     rebuild = True
                     break
             else:
                 # check the collection of files to be pushed and check if curr file
                 # is part of this list ... also we explore sub-dependencies as well
-                if files_to_be_pushed_not_empty and not os.path.islink(entry_path):
-                    if os.path.isdir(entry_path):
+                if files_to_be_pushed_not_empty and not entry.is_symlink():
+                    # answer from the pushed files outward when the index is available
+                    if not impact_query_attempted:
+                        # a direct hit settles it before any dependency is looked at
+                        if has_direct_hit(candidate_entries, files_to_be_pushed):
+                            rebuild = True
+                            break
+                        enter_decision_stage("dependency closure")
+                        impacted_entries = get_impacted_root_entries(root_dirs, files_to_be_pushed,
+                                                                     candidate_entries)
+                        impact_query_attempted = True
+                    if impacted_entries is not None:
+                        if entry_path in impacted_entries:
+                            rebuild = True
+                            break
+                    elif entry.is_dir():
                         if is_dir_and_dependencies_to_be_pushed(entry_path, files_to_be_pushed):
                             # print("is_dir_and_dependencies_to_be_pushed")
                             rebuild = True
                             break
-                    elif os.path.isfile(entry_path):
-                        if is_file_and_dependencies_to_be_pushed(entry, entry_path, files_to_be_pushed):
+                    elif entry.is_file():
+                        if is_file_and_dependencies_to_be_pushed(entry.name, entry_path, files_to_be_pushed):
                             # print("is_file_and_dependencies_to_be_pushed")
                             rebuild = True
                             break
@@ -191,282 +956,3512 @@ def check_for_api_committed_changes(root_dirs,
     return rebuild
 
 
+"""
+Function checks whether the changed files of a push
+touch the API: the swagger spec itself, a file under a
+root dir, or a file some root dir file depends on ...
+answered from the changed files outward when the index
+is available, else through the dependency graph
+param: root_dirs [list of primary paths]
+param: swagger_file_path (str) or None
+param: files_to_be_pushed (PathTrie of changed files)
+return: boolean
+"""
+@traced("check_api_range_changes")
+def check_for_api_range_changes(root_dirs, swagger_file_path, files_to_be_pushed):
+    if not root_dirs or len(files_to_be_pushed) == 0:
+        return False
+    enter_decision_stage("swagger check")
+    if swagger_file_path and get_git_relative_path(swagger_file_path) in files_to_be_pushed:
+        # the same swagger surface before and after the push needs no rebuild
+        if is_swagger_surface_pushed() is not False:
+            return True
+    if has_direct_hit(root_dirs, files_to_be_pushed):
+        return True
+    enter_decision_stage("dependency closure")
+    impacted_entries = get_impacted_root_entries(root_dirs, files_to_be_pushed)
+    if impacted_entries is not None:
+        return bool(impacted_entries)
+    for root_dir in root_dirs:
+        for entry in list_directory(root_dir).values():
+            if entry.is_symlink():
+                continue
+            if entry.is_dir():
+                if is_dir_and_dependencies_to_be_pushed(entry.path, files_to_be_pushed):
+                    return True
+            elif entry.is_file():
+                if is_file_and_dependencies_to_be_pushed(entry.name, entry.path, files_to_be_pushed):
+                    return True
+    return False
+
+
+"""
+Function checks for a direct hit: a pushed file inside
+one of the given root dirs/entries ... the cheapest
+rebuild reason after the swagger spec, no dependency
+is looked at
+param: dir_paths (iterable of root dirs or root dir entries)
+param: files_to_be_pushed (PathTrie of files to be pushed)
+return: boolean
+"""
+def has_direct_hit(dir_paths, files_to_be_pushed):
+    enter_decision_stage("direct hits")
+    for dir_path in dir_paths:
+        git_path = get_git_relative_path(dir_path)
+        if git_path in files_to_be_pushed or files_to_be_pushed.contains_subtree(git_path):
+            return True
+    return False
+
+
 """
 Function reads the content of the file for the
 include lines: using .* and then parses it for
 the section indicating the dependencies ...
 param: file_path (str)
-param: files_to_be_pushed (set of files to pushed)
+param: files_to_be_pushed (PathTrie of files to pushed)
 return: boolean
 """
+@traced("explore_dependencies")
 def explore_dependencies(file_path, files_to_be_pushed):
-    if "win" in sys.platform:
-        search_str = f'type {file_path} | findstr using'
-    else:
-        search_str = f'cat {file_path} | grep using'
-    file_content_stream = os.popen(search_str)
-    searched_file_content_arr = file_content_stream.readlines()
-    if len(searched_file_content_arr) == 0:
-        return False # means no rebuild necessary
-
-    # otherwise extract the dependencies from the file...
-    filtered_list = list(filter(lambda entry: CONSTANTS["EDGEZONERP"] in entry, searched_file_content_arr))
-    # print("filtered_list in explore_dependencies: ", filtered_list)
-
-    # get the extension after "EdgeZoneRP" and build new paths for them...
-    entries = get_full_path_for_extensions(CONSTANTS["EXTENSIONS_BASE_DIR"], filtered_list)
-    # print("entries in explore_dependencies: ", entries)
-
-    # loop through the list and for each entry call appropraite function
-    for entry_path in entries:
-        if os.path.isdir(entry_path):
-            if is_dir_and_dependencies_to_be_pushed(entry_path, files_to_be_pushed):
-                return True
-        elif os.path.isfile(entry_path):
-            entry = entry_path.split("\\")[-1] # extract the file/dir name
-            if is_file_and_dependencies_to_be_pushed(entry, entry_path, files_to_be_pushed):
-                return True
-    return False
+    check_deadline()
+    dependency_graph = get_dependency_graph(files_to_be_pushed)
+    if dependency_graph.uses_previous_namespace(file_path):
+        return True
+    for dependency_path in dependency_graph.get_edges(file_path):
+        if dependency_graph.reaches_pushed_file(dependency_path):
+            return True
+    return False # means no rebuild necessary
+
 
-                                 
 """
-Takes in list: e.g. "using .*.EdgeZoneRP.*;"
-Filters this list and constructs a full path
-to the dependency directories to perform full
-search ... 
-param: base_path (str)
-param: filtered_list (arr)
-return: entries (list of dirs and files dependencies)
-"""
-def get_full_path_for_extensions(base_path, filtered_list):
-    entries = []
-    for entry in filtered_list:
-        res = re.findall(CONSTANTS["DEPENDENCY_REGEX"], entry.strip())
-        if len(res) == 0:
-            continue
-        trimmed = res[0][len(CONSTANTS["EDGEZONERP"]):-1] # with sep='.'
-        trimmed_mod_sep = trimmed.replace('.', "\\")
-        # build the full path ... and add to list ...
-        full_path = base_path + trimmed_mod_sep
-        entries.append(full_path)
-    # return the final list ...
-    return entries
+Function reads the content of the file for the
+include lines: using .* and resolves the EdgeZoneRP
+ones to the files declaring those namespaces ...
+param: file_path (str)
+return: (list) of dependency paths (files)
+"""
+def parse_file_dependencies(file_path):
+    namespace_trie = get_namespace_trie()
+    dependency_paths = set()
+    for namespace in get_file_dependency_namespaces(file_path, namespace_trie):
+        dependency_paths.update(namespace_trie.get_files(namespace))
+    base_dir = CONSTANTS["REPO_BASE_DIR"]
+    return [os.path.join(base_dir, *path.split("/")) for path in sorted(dependency_paths)]
 
 
 """
-Function searches for the full_path of the
-swagger file... Could just hardcode this but
-what's the fun in it haha
+Function returns the namespaces the EdgeZoneRP 'using'
+lines of a file resolve to (see NamespaceTrie.resolve)
+param: file_path (str)
+param: namespace_trie (NamespaceTrie)
+return: (set) of namespaces (str)
 """
-def get_swagger_file_path():
-    base_dir = os.getcwd()
-    splitted_substrs = base_dir.split("\\.")
-    if len(splitted_substrs) == 0:
-        return None
-    search_base_dir = splitted_substrs[0]
-    return search_for_swagger_file_path(search_base_dir)
+def get_file_dependency_namespaces(file_path, namespace_trie):
+    filtered_list = get_dependency_lines(file_path)
+    namespaces = set()
+    for target in get_using_targets(filtered_list):
+        namespace = namespace_trie.resolve(target)
+        if namespace:
+            namespaces.add(namespace)
+    return namespaces
 
 
 """
-Function searches for swagger spec file
-from search_base_dir recursively ... Search
-only hardlinks [symlinks are ignored]
-param: search_base_dir
-return: swagger_file_path (str)
+Function returns the dependency lines of a file, through
+the dependency index when there is one (it only re-reads
+files whose key changed) ... an index failing on the way
+is dropped (see drop_dependency_index)
+param: file_path (str)
+return: (list) of 'using EdgeZoneRP.*;' and 'namespace *;' lines
 """
-def search_for_swagger_file_path(search_base_dir):
-    # search for the swagger file fullpath...
-    for entry in os.listdir(search_base_dir):
-        full_path = f'{search_base_dir}\\{entry}'
-        # print("swagger: " + full_path)
-        condition_1 = entry == CONSTANTS["SWAGGER_FILE_NAME"]
-        condition_2 = os.path.isfile(full_path)
-        condition_3 = not entry.startswith(".")
-        condition_4 = not os.path.islink(full_path)
-        condition_5 = os.path.isdir(full_path)
-        if condition_1 and condition_2:
-            return full_path
-        if condition_3 and condition_4 and condition_5:
-            result = search_for_swagger_file_path(full_path)
-            if result:
-                return result
-    return None
+def get_dependency_lines(file_path):
+    import sqlite3
+    dependency_index = get_dependency_index()
+    if not dependency_index:
+        return read_dependency_lines(file_path)
+    try:
+        return dependency_index.get_dependency_lines(file_path)
+    except sqlite3.Error as error:
+        drop_dependency_index()
+        raise DependencyIndexError(str(error))
 
 
 """
-Function builds the roots directory paths
-we want to begin searching for updates to 
-API changes ... uses os.getcwd() etc...
-return root_dirs (array) None == abort
+Function returns the targets of the 'using X;' lines
+param: dependency_lines (list of canonical lines)
+return: (list) of targets (str)
 """
-def get_root_directories():
-    base_dir = os.getcwd()
-    splitted_substrs = base_dir.split("\\.")
-    if len(splitted_substrs) == 0:
-        return None
-    # print(splitted_substrs[0])
-    # extract the actual base dir and reconstruct paths
-    # to the relevant classes: Attributes class/dir and 
-    # Controllers class/dir ...
-    root_dirs = []
-    search_base_dir = splitted_substrs[0]
-
-    # assumes that there exist a single unique folder by those names
-    # across the entire repository ....
-    dirs_to_found = len(CONSTANTS["ROOT_DIRECTORIES"])
-    search_for_root_directories(search_base_dir, root_dirs, dirs_to_found)
-    if len(root_dirs) == 0:
-        return None
-    return root_dirs
+def get_using_targets(dependency_lines):
+    return [line[len("using "):-1] for line in dependency_lines if line.startswith("using ")]
 
 
 """
-Function searches for root directories
-from base_dir recursively ... We search
-only hardlinks [symlinks are ignored]
-param: base_dir
-param: root_dirs (list of relevant directories)
-param: dirs_to_found (num dirs to find)
-return: root_dirs (list)
+Function returns the namespaces of the 'namespace X;' lines
+param: dependency_lines (list of canonical lines)
+return: (list) of declared namespaces (str)
 """
-def search_for_root_directories(base_dir, root_dirs, dirs_to_found):
-    if dirs_to_found != 0:
-        for entry in os.listdir(base_dir):
-            full_path = f'{base_dir}\\{entry}'
-            # print(full_path)
-            condition_1 = not entry.startswith(".")
-            condition_2 = not os.path.islink(full_path)
-            condition_3 = os.path.isdir(full_path)
-            if condition_1 and condition_2 and condition_3:
-                if entry in CONSTANTS["ROOT_DIRECTORIES"]:
-                    root_dirs.append(full_path)
-                    dirs_to_found -= 1
-                    # perform look-ahead to exit early...
-                    if dirs_to_found == 0:
-                        break
-                # continue searching for the relevant directories
-                search_for_root_directories(full_path, root_dirs, dirs_to_found)
-                # perform a look-ahead to exit early ...
-                if len(root_dirs) == len(CONSTANTS["ROOT_DIRECTORIES"]):
-                    break
+def get_declared_namespaces(dependency_lines):
+    return [line[len("namespace "):-1] for line in dependency_lines
+            if line.startswith("namespace ")]
 
 
 """
-Function formats unformatted remote_branch
-path to extract the remote branch name 
-e.g. refs/heads/master -> master
+Function reads the content of the file for the
+include lines: using .* and keeps the EdgeZoneRP ones,
+together with the namespaces the file declares ...
+The file is read in binary chunks
+param: file_path (str)
+return: (list) of 'using EdgeZoneRP.*;' and 'namespace *;' lines
+"""
+def read_dependency_lines(file_path):
+    TRACER.count("files_read")
+    # in the pushed commit's tree: stream the blob from git
+    entry = get_cached_entry(file_path)
+    if isinstance(entry, GitTreeEntry):
+        blob_chunks = get_git_blob_reader().iter_blob_chunks(entry.object_id)
+        try:
+            return parse_source_declarations(blob_chunks)
+        finally:
+            blob_chunks.close() # drains what the parser did not need
+    try:
+        with open(file_path, "rb") as file_handle:
+            chunk_size = CONSTANTS["READ_CHUNK_SIZE"]
+            chunks = iter(lambda: file_handle.read(chunk_size), b"")
+            return parse_source_declarations(chunks)
+    except OSError:
+        return [] # unreadable files have no dependencies
+
 
 """
-def extract_remote_branch_name(remote_branch_unformatted):
-    remote_branch_unformatted = remote_branch_unformatted.strip()
-    splitted = remote_branch_unformatted.split("/")
-    if len(splitted) != 3: # expected at least [refs/head/***remote_name***]
-        return None
-    return splitted[2]
-
-
-"""
-Function returns the files git push
-will be modifying ...
-return: (set) of files to be pushed
-"""
-def get_files_to_be_pushed():
-    _, remote_repo, _, _, _, remote_branch_unformatted, _ = sys.argv
-    remote_branch = extract_remote_branch_name(remote_branch_unformatted)
-    full_diff_param = f'{remote_repo}/{remote_branch}'
-    # build the command for getting the modified files to be pushed
-    command = f'git diff --name-only --cached {full_diff_param}'
-    return_stream = os.popen(command)
-    return_list = return_stream.readlines()
-    # create the new set to return ...
-    formatted_return_set = set()
-    for return_item in return_list:
-        return_splitted = return_item.strip().split("/")
-        if return_splitted:
-            formatted_return_set.add(return_splitted[-1])
-    return formatted_return_set
-    
+Function splits a stream of byte chunks into
+decoded text lines ...
+param: chunks (iterable of bytes)
+return: generator of lines (str)
+"""
+def iter_decoded_lines(chunks):
+    remainder = b""
+    for chunk in chunks:
+        lines = (remainder + chunk).split(b"\n")
+        remainder = lines.pop()
+        for line in lines:
+            yield line.decode("utf-8", errors="replace")
+    if remainder:
+        yield remainder.decode("utf-8", errors="replace")
+
 
 """
-Function returns the path to the 
-base directory ... hardcoded here
-as: .*\src\EdgeZoneRP\.*
-CHECK RETURN VALUE WHEN len(splitted_substrs) == 0
-return: base directory path for repo (str)
+Function removes comments (and string literals) from
+one line of C# ... block comments can span lines
+param: line (str)
+param: in_block_comment (boolean) state from the previous line
+param: keep_literals (boolean) keep the string/char literals
+return: (code (str), in_block_comment (boolean))
+"""
+def strip_comments(line, in_block_comment, keep_literals=False):
+    code = []
+    position = 0
+    while position < len(line):
+        if in_block_comment:
+            block_end = line.find("*/", position)
+            if block_end == -1:
+                return "".join(code), True
+            position = block_end + 2
+            in_block_comment = False
+            continue
+        match = COMMENT_OR_STRING_PATTERN.search(line, position)
+        if not match:
+            code.append(line[position:])
+            break
+        code.append(line[position:match.start()])
+        if match.group() == "//":
+            break
+        if match.group() == "/*":
+            in_block_comment = True
+        else:
+            # keep a placeholder for the literal
+            code.append(match.group() if keep_literals else '""')
+        position = match.end()
+    return "".join(code), in_block_comment
+
+
+"""
+Function parses a C# source (given as byte chunks) and
+returns, in canonical form, its EdgeZoneRP 'using X;'
+directives and its 'namespace X;' declarations ...
+1. comments, strings and chars are skipped, directives
+   may span several lines
+2. 'using static X;', 'using Alias = X;' and
+   'global using X;' all resolve to X
+3. a 'using' section ends at the first namespace/type
+   declaration, after that only namespace declarations
+   (block, nested and file scoped) are tracked, through
+   the braces that open and close them
+4. every namespace body starts a 'using' section of its
+   own (usings placed inside the namespace, SA1200)
+param: chunks (iterable of bytes)
+return: (list) of 'using EdgeZoneRP.*;' and 'namespace *;' lines
+"""
+def parse_source_declarations(chunks):
+    dependency_lines = []
+    declared_namespaces = []
+    pending = "" # code of the statement being read
+    in_block_comment = False
+    in_using_section = True
+    depth = 0 # of braces
+    namespace_stack = [] # (namespace, depth of its block), innermost last
+    namespace_name = None # declared, waiting for its '{' or ';'
+    for line_number, line in enumerate(iter_decoded_lines(chunks)):
+        if line_number == 0:
+            line = line.lstrip("\ufeff") # utf-8 byte order mark
+        code, in_block_comment = strip_comments(line, in_block_comment)
+        if code.lstrip().startswith("#"):
+            continue # preprocessor directive (#region, #if ...)
+        pending = f'{pending} {code}'.strip() if pending else code.strip()
+        while pending:
+            if in_using_section:
+                statement, separator, rest = pending.partition(";")
+                if DECLARATION_PATTERN.match(pending) or "{" in statement:
+                    in_using_section = False
+                    continue
+                if not separator:
+                    break # statement continues on the next line
+                directive = USING_DIRECTIVE_PATTERN.match(statement.strip())
+                if directive:
+                    dependency_line = f'using {directive.group("target")};'
+                    if DEPENDENCY_PATTERN.search(dependency_line):
+                        dependency_lines.append(dependency_line)
+                pending = rest.strip()
+                continue
+
+            opened_namespace = False
+            for token in NAMESPACE_TOKEN_PATTERN.finditer(pending):
+                if token.group("name"):
+                    enclosing = namespace_stack[-1][0] if namespace_stack else ""
+                    namespace_name = f'{enclosing}.{token.group("name")}'.lstrip(".")
+                elif token.group() == "{":
+                    depth += 1
+                    if namespace_name:
+                        namespace_stack.append((namespace_name, depth))
+                        opened_namespace = True
+                elif token.group() == "}":
+                    if namespace_stack and namespace_stack[-1][1] == depth:
+                        namespace_stack.pop()
+                    depth -= 1
+                elif namespace_name:
+                    # file scoped 'namespace X;' covers the rest of the file
+                    namespace_stack.append((namespace_name, -1))
+                    opened_namespace = True
+                if opened_namespace:
+                    declared_namespaces.append(namespace_name)
+                    namespace_name = None
+                    # its body starts with a using section of its own
+                    in_using_section = True
+                    pending = pending[token.end():].strip()
+                    break
+            if not opened_namespace:
+                pending = ""
+    for namespace in dict.fromkeys(declared_namespaces):
+        dependency_lines.append(f'namespace {namespace};')
+    return dependency_lines
+
+
+"""
+Persistent on-disk index of parsed dependencies
+stored as SQLite under .git/ ...
+A. maps every file (repo relative path) to its
+   'using EdgeZoneRP.*;' lines and declared namespaces
+B. each row is keyed by the file's (mtime_ns, size), or its
+   blob id when read from git objects, so only files whose
+   key changed are read again
+C. keeps the reverse edges as well: 'using' target ->
+   dependent files, and namespace -> declaring files, so
+   impact queries can start from the pushed files
+D. rows are looked up lazily, new and changed rows are
+   written back by save()
+"""
+class DependencyIndex:
+    def __init__(self, index_path):
+        import sqlite3
+        self.connection = sqlite3.connect(index_path)
+        schema = CONSTANTS["DEPENDENCY_INDEX_SCHEMA"]
+        (user_version,) = self.connection.execute("PRAGMA user_version").fetchone()
+        if user_version != schema:
+            # layout changed: the cached rows cannot be trusted
+            for table in ("dependencies", "dependents", "declarations", "metadata"):
+                self.connection.execute(f"DROP TABLE IF EXISTS {table}")
+            self.connection.execute(f"PRAGMA user_version = {int(schema)}")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS dependencies ("
+                                "path TEXT PRIMARY KEY, mtime_ns INTEGER, "
+                                "size INTEGER, blob TEXT, lines TEXT)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS dependents ("
+                                "target TEXT, path TEXT)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS dependents_by_target "
+                                "ON dependents (target)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS dependents_by_path "
+                                "ON dependents (path)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS declarations ("
+                                "namespace TEXT, path TEXT)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS declarations_by_path "
+                                "ON declarations (path)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS metadata ("
+                                "key TEXT PRIMARY KEY, value TEXT)")
+        self.rows = {} # path -> (mtime_ns, size, blob, lines), None == no row
+        self.dirty = {} # path -> row to write back, None == delete
+        self.fresh = False # True while something else (the daemon) keeps it current
+        self.namespace_trie = None # loaded from the declarations table
+
+    """
+    Method returns (and caches) the stored row of a path
+    param: key_path (str repo relative path)
+    return: (mtime_ns, size, blob, lines) or None
+    """
+    def get_row(self, key_path):
+        if key_path not in self.rows:
+            self.rows[key_path] = self.connection.execute(
+                "SELECT mtime_ns, size, blob, lines FROM dependencies WHERE path = ?",
+                (key_path,)).fetchone()
+        return self.rows[key_path]
+
+    """
+    Method returns the dependency lines of file_path,
+    reading the file only when its key changed
+    param: file_path (str)
+    return: (list) of 'using EdgeZoneRP.*;' lines
+    """
+    def get_dependency_lines(self, file_path):
+        entry = get_cached_entry(file_path)
+        if not entry:
+            return read_dependency_lines(file_path)
+        if isinstance(entry, GitTreeEntry):
+            content_key = (None, None, entry.object_id)
+        else:
+            stat_result = entry.stat()
+            content_key = (stat_result.st_mtime_ns, stat_result.st_size, None)
+        key_path = get_git_relative_path(file_path)
+        row = self.get_row(key_path)
+        if row and row[:3] == content_key:
+            return row[3].split("\n") if row[3] else []
+
+        dependency_lines = read_dependency_lines(file_path)
+        row = (*content_key, "\n".join(dependency_lines))
+        self.rows[key_path] = row
+        self.dirty[key_path] = row
+        return dependency_lines
+
+    """
+    Method drops the row of a file that no longer exists
+    param: key_path (str repo relative path)
+    """
+    def remove(self, key_path):
+        if self.get_row(key_path) is not None:
+            self.rows[key_path] = None
+            self.dirty[key_path] = None
+
+    """
+    Method returns the files whose 'using' refers to
+    namespace: 'using namespace;' itself, or a type of it
+    ('using static namespace.Type;', aliases), see
+    NamespaceTrie.refers_to
+    param: namespace (str)
+    param: namespace_trie (NamespaceTrie) the declared namespaces
+    return: (list) of repo relative file paths
+    """
+    def get_dependents(self, namespace, namespace_trie):
+        # namespace.* sorts between 'namespace.' and 'namespace/'
+        rows = self.connection.execute(
+            "SELECT target, path FROM dependents WHERE target = ? OR "
+            "(target > ? AND target < ?)", (namespace, f'{namespace}.', f'{namespace}/'))
+        return [path for target, path in rows if namespace_trie.refers_to(target, namespace)]
+
+    """
+    Method returns the namespaces a file declares ... for a
+    .cs file that is gone (deleted by the push) the ones its
+    directory holds (see get_deleted_file_namespaces)
+    param: key_path (str repo relative path)
+    param: namespace_trie (NamespaceTrie)
+    return: (list) of namespaces (str)
+    """
+    def get_file_namespaces(self, key_path, namespace_trie):
+        row = self.get_row(key_path)
+        if row is not None:
+            return get_declared_namespaces(row[3].split("\n") if row[3] else [])
+        return get_deleted_file_namespaces(key_path, namespace_trie)
+
+    """
+    Method returns (and caches until the next save) the
+    trie of every namespace declared by an indexed file
+    return: NamespaceTrie
+    """
+    def get_namespace_trie(self):
+        if self.namespace_trie is None:
+            self.namespace_trie = NamespaceTrie()
+            for namespace, path in self.connection.execute(
+                    "SELECT namespace, path FROM declarations"):
+                self.namespace_trie.add(namespace, path)
+        return self.namespace_trie
+
+    """
+    Method reads a value from the metadata table
+    param: key (str)
+    return: value (str) or None
+    """
+    def get_metadata(self, key):
+        row = self.connection.execute(
+            "SELECT value FROM metadata WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    """
+    Method writes a value to the metadata table
+    param: key (str)
+    param: value (str)
+    """
+    def set_metadata(self, key, value):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO metadata VALUES (?, ?)", (key, value))
+
+    """
+    Method brings the index up to date for every file
+    under the given dirs, so reverse queries are complete ...
+    1. the first run (or an unknown indexed commit) indexes
+       every file under the dirs
+    2. later runs only revisit what git reports as changed
+       since the indexed commit (against the analysed commit
+       or the working tree), plus untracked files and the
+       paths that were dirty during the previous refresh
+    param: dir_paths (list of dirs to keep indexed)
+    """
+    @traced("refresh_dependency_index")
+    def refresh(self, dir_paths):
+        analysis_commit = ANALYSIS_STATE["commit"]
+        if self.fresh and not analysis_commit:
+            return
+        git_dirs = [get_git_relative_path(dir_path) for dir_path in dir_paths]
+        if analysis_commit:
+            head = analysis_commit
+        else:
+            head = read_git_lines(["rev-parse", "--verify", "-q", "HEAD"])
+            head = head[0] if head else ""
+        indexed_commit = self.get_metadata("indexed_commit")
+        indexed_dirs = self.get_metadata("indexed_dirs")
+
+        changed_paths = None
+        if indexed_commit and indexed_dirs == "\n".join(git_dirs):
+            # without a second commit git diffs against the working tree
+            compared_to = [analysis_commit] if analysis_commit else []
+            changed_paths = read_git_lines(["diff", "--name-only", indexed_commit,
+                                            *compared_to, "--", *git_dirs], check=True)
+        if changed_paths is None:
+            # cold (or unusable) index: visit every file once
+            changed_paths = []
+            for dir_path in dir_paths:
+                changed_paths.extend(get_git_relative_path(file_path)
+                                     for file_path in iter_directory_files(dir_path))
+        changed_paths = set(changed_paths)
+        previously_dirty = self.get_metadata("dirty_paths")
+        if previously_dirty:
+            changed_paths.update(previously_dirty.split("\n"))
+
+        # paths differing from HEAD must be rechecked next time
+        dirty_paths = set()
+        if not analysis_commit:
+            untracked_paths = read_git_lines(["ls-files", "--others",
+                                              "--exclude-standard", "--", *git_dirs])
+            changed_paths.update(untracked_paths)
+            dirty_paths.update(untracked_paths)
+            dirty_paths.update(read_git_lines(["diff", "--name-only", "HEAD", "--", *git_dirs]))
+
+        base_dir = CONSTANTS["REPO_BASE_DIR"]
+        try:
+            for key_path in changed_paths:
+                check_deadline()
+                file_path = os.path.join(base_dir, key_path.replace("/", os.sep))
+                entry = get_cached_entry(file_path)
+                if entry and entry.is_file() and not entry.is_symlink():
+                    self.get_dependency_lines(file_path)
+                else:
+                    self.remove(key_path)
+        except DeadlineExceeded:
+            # keep the rows parsed so far, the next refresh
+            # finds them current and reads only the rest
+            save_dependency_index()
+            raise
+
+        self.set_metadata("indexed_commit", head)
+        self.set_metadata("indexed_dirs", "\n".join(git_dirs))
+        self.set_metadata("dirty_paths", "\n".join(sorted(dirty_paths)))
+        if analysis_commit and self.dirty:
+            self.fresh = False # its rows now hold that commit's files
+        self.save()
+
+    """
+    Method re-indexes just the given files (e.g. the ones
+    inotify reported), they are rechecked by the next
+    git based refresh as well
+    param: file_paths (iterable of file paths)
+    """
+    def refresh_paths(self, file_paths):
+        key_paths = set()
+        for file_path in file_paths:
+            key_path = get_git_relative_path(file_path)
+            key_paths.add(key_path)
+            entry = get_cached_entry(file_path)
+            if entry and entry.is_file() and not entry.is_symlink():
+                self.get_dependency_lines(file_path)
+            else:
+                self.remove(key_path)
+        if key_paths:
+            previously_dirty = self.get_metadata("dirty_paths")
+            if previously_dirty:
+                key_paths.update(previously_dirty.split("\n"))
+            self.set_metadata("dirty_paths", "\n".join(sorted(key_paths)))
+        self.save()
+
+    """
+    Method returns every file that is pushed or depends,
+    directly or transitively, on a pushed file. The walk
+    goes outward from the pushed paths over the reverse
+    edges (file -> the namespaces it declares -> the files
+    using them), so it only touches the affected part ...
+    the namespaces the pushed files declared before the push
+    (see get_previous_namespaces) are walked last, so a
+    renamed or deleted namespace still reaches its users
+    param: pushed_paths (iterable of repo relative paths)
+    param: stop_at (function path -> boolean) optional, the walk
+           ends at the first impacted path it accepts
+    return: (set) of repo relative file paths (the ones found
+            so far when stop_at ended the walk)
+    """
+    def get_impacted_paths(self, pushed_paths, stop_at=None):
+        namespace_trie = self.get_namespace_trie()
+        impacted_paths = set(pushed_paths)
+        if stop_at and any(stop_at(path) for path in impacted_paths):
+            return impacted_paths
+        frontier = [(path, 0) for path in impacted_paths] # (path, dependency depth)
+        visited_namespaces = set()
+        previous_namespaces = None # read from git once the frontier runs dry
+        while frontier or previous_namespaces is None:
+            check_deadline()
+            if frontier:
+                path, depth = frontier.pop()
+                TRACER.record_max("reverse_dependency_depth", depth)
+                namespaces = self.get_file_namespaces(path, namespace_trie)
+            else:
+                previous_namespaces = get_previous_namespaces(pushed_paths)
+                namespaces, depth = previous_namespaces, 0
+            for namespace in namespaces:
+                if namespace in visited_namespaces:
+                    continue
+                visited_namespaces.add(namespace)
+                for dependent in self.get_dependents(namespace, namespace_trie):
+                    if dependent not in impacted_paths:
+                        impacted_paths.add(dependent)
+                        if stop_at and stop_at(dependent):
+                            return impacted_paths # enough for the caller
+                        frontier.append((dependent, depth + 1))
+        TRACER.count("impacted_files", len(impacted_paths))
+        return impacted_paths
+
+    """
+    Method writes new/changed rows (and their reverse
+    edges) back to disk
+    """
+    def save(self):
+        if self.dirty:
+            self.namespace_trie = None # declarations change
+        for path, row in self.dirty.items():
+            self.connection.execute("DELETE FROM dependents WHERE path = ?", (path,))
+            self.connection.execute("DELETE FROM declarations WHERE path = ?", (path,))
+            if row is None:
+                self.connection.execute("DELETE FROM dependencies WHERE path = ?", (path,))
+                continue
+            self.connection.execute("INSERT OR REPLACE INTO dependencies VALUES (?, ?, ?, ?, ?)",
+                                    (path, *row))
+            dependency_lines = row[3].split("\n") if row[3] else []
+            self.connection.executemany("INSERT INTO dependents VALUES (?, ?)",
+                                        [(target, path) for target in
+                                         set(get_using_targets(dependency_lines))])
+            self.connection.executemany("INSERT INTO declarations VALUES (?, ?)",
+                                        [(namespace, path) for namespace in
+                                         get_declared_namespaces(dependency_lines)])
+        self.dirty = {}
+        self.connection.commit()
+
+
+"""
+Trie of declared namespaces, keyed by their segments
+A. exact lookups: the files declaring a namespace
+B. prefix lookups: the longest declared prefix of a name
+   ('using static A.B.Type;' resolves to A.B)
+"""
+class NamespaceTrie:
+    FILES = "" # never a namespace segment
+
+    def __init__(self):
+        self.root = {}
+        self.dir_namespaces = {} # repo relative dir -> namespaces declared in it
+
+    """
+    Method records that path declares namespace
+    param: namespace (str) e.g. 'EdgeZoneRP.Models'
+    param: path (str repo relative file path)
+    """
+    def add(self, namespace, path):
+        node = self.root
+        for segment in namespace.split("."):
+            node = node.setdefault(segment, {})
+        node.setdefault(NamespaceTrie.FILES, set()).add(path)
+        self.dir_namespaces.setdefault(posixpath.dirname(path), set()).add(namespace)
+
+    """
+    Method walks the trie down along namespace
+    param: namespace (str)
+    return: trie node (dict) or None
+    """
+    def find_node(self, namespace):
+        node = self.root
+        for segment in namespace.split("."):
+            node = node.get(segment)
+            if node is None:
+                return None
+        return node
+
+    """
+    Method returns the files declaring exactly namespace
+    param: namespace (str)
+    return: (set) of repo relative file paths
+    """
+    def get_files(self, namespace):
+        node = self.find_node(namespace)
+        return node.get(NamespaceTrie.FILES, set()) if node else set()
+
+    """
+    Method returns the longest declared namespace that is
+    name or a prefix of it ... what a 'using' target refers to
+    param: name (str) namespace or namespace qualified type
+    return: namespace (str) or None
+    """
+    def resolve(self, name):
+        node = self.root
+        resolved = None
+        segments = name.split(".")
+        for position, segment in enumerate(segments):
+            node = node.get(segment)
+            if node is None:
+                break
+            if NamespaceTrie.FILES in node:
+                resolved = ".".join(segments[:position + 1])
+        return resolved
+
+    """
+    Method tells whether a 'using' target refers to namespace:
+    the namespace itself or a type of it ... once namespace is
+    no longer declared (renamed, deleted) every name below it
+    that no other declared namespace claims does
+    param: target (str) of a 'using' line
+    param: namespace (str)
+    return: boolean
+    """
+    def refers_to(self, target, namespace):
+        if target == namespace:
+            return True
+        if not target.startswith(f'{namespace}.'):
+            return False
+        resolved = self.resolve(target)
+        return resolved is None or len(resolved) <= len(namespace)
+
+    def __contains__(self, namespace):
+        node = self.find_node(namespace)
+        return bool(node) and NamespaceTrie.FILES in node
+
+
+"""
+Function returns the namespaces a deleted .cs file most
+likely declared: the ones declared in its directory, and
+the one its folder path spells below EXTENSIONS_BASE_DIR
+param: git_path (str repo relative path)
+param: namespace_trie (NamespaceTrie)
+return: (list) of namespaces (str)
+"""
+def get_deleted_file_namespaces(git_path, namespace_trie):
+    if not git_path.endswith(".cs"):
+        return []
+    namespaces = set(namespace_trie.dir_namespaces.get(posixpath.dirname(git_path), ()))
+    extensions_dir = get_git_relative_path(CONSTANTS["EXTENSIONS_BASE_DIR"])
+    if git_path.startswith(f'{extensions_dir}/'):
+        folders = git_path[len(extensions_dir) + 1:].split("/")[:-1]
+        namespaces.add(".".join([CONSTANTS["EDGEZONERP"], *folders]))
+    return sorted(namespaces)
+
+
+"""
+Function returns the commits holding what the remote has
+of the ref being analysed: its remote_oid, or for a new
+ref (or a remote_oid we do not have) the boundaries where
+the pushed history joins the history of the remotes
+return: (list) of commits, [] when none of it is published
+"""
+def get_push_base_commits():
+    if not ANALYSIS_STATE["push_range"]:
+        return []
+    remote_oid, local_oid = ANALYSIS_STATE["push_range"]
+    probe_key = ("push_base_commits", remote_oid, local_oid)
+    if probe_key not in PROBE_RESULTS:
+        base_commits = []
+        if remote_oid.strip("0"):
+            base_commits = read_git_lines(["rev-parse", "--verify", "-q",
+                                           f'{remote_oid}^{{commit}}'])
+        if not base_commits and local_oid.strip("0"):
+            revisions = read_git_lines(["rev-list", "--boundary", local_oid, "--not", "--remotes"])
+            base_commits = [revision[1:] for revision in revisions if revision.startswith("-")]
+        PROBE_RESULTS[probe_key] = base_commits
+    return PROBE_RESULTS[probe_key]
+
+
+"""
+Function returns the namespaces the pushed .cs files
+declared before the push, read from their blobs in the
+commits the remote has (see get_push_base_commits) ... a
+file renaming its namespace leaves the files 'using' the
+old one broken, just as a deleted file does
+param: pushed_paths (iterable of repo relative paths)
+return: (set) of namespaces (str)
+"""
+def get_previous_namespaces(pushed_paths):
+    namespaces = set()
+    base_commits = get_push_base_commits()
+    for git_path in pushed_paths:
+        # cat-file --batch reads one object name per line
+        if not git_path.endswith(".cs") or "\n" in git_path:
+            continue
+        for base_commit in base_commits:
+            check_deadline()
+            blob_chunks = get_git_blob_reader().iter_blob_chunks(f'{base_commit}:{git_path}')
+            try:
+                namespaces.update(get_declared_namespaces(parse_source_declarations(blob_chunks)))
+            finally:
+                blob_chunks.close() # drains what the parser did not need
+    return namespaces
+
+
+"""
+Function returns the dirs whose files can declare
+namespaces the API depends on (and that get indexed)
+return: (list) of dir paths
+"""
+def get_indexed_dirs():
+    return [CONSTANTS["EXTENSIONS_BASE_DIR"], *(get_root_directories() or [])]
+
+
+"""
+Function returns (once per analysed commit) the trie
+of the namespaces declared under the indexed dirs ...
+from the dependency index when available, otherwise by
+parsing every file once
+return: NamespaceTrie
+"""
+@traced("namespace_trie")
+def get_namespace_trie():
+    import sqlite3
+    analysis_commit = ANALYSIS_STATE["commit"]
+    namespace_trie = NAMESPACE_TRIES.get(analysis_commit)
+    if namespace_trie is not None:
+        return namespace_trie
+    dependency_index = get_dependency_index()
+    if dependency_index:
+        try:
+            dependency_index.refresh(get_indexed_dirs())
+            namespace_trie = dependency_index.get_namespace_trie()
+        except sqlite3.Error:
+            drop_dependency_index()
+            namespace_trie = None
+    if namespace_trie is None:
+        namespace_trie = NamespaceTrie()
+        for dir_path in get_indexed_dirs():
+            for file_path in iter_directory_files(dir_path):
+                for namespace in get_declared_namespaces(read_dependency_lines(file_path)):
+                    namespace_trie.add(namespace, get_git_relative_path(file_path))
+    NAMESPACE_TRIES[analysis_commit] = namespace_trie
+    return namespace_trie
+
+
+"""
+Function yields every (non hidden, non symlink) file
+below dir_path, using the cached directory listings
+param: dir_path (str)
+return: generator of file paths (str)
+"""
+def iter_directory_files(dir_path):
+    stack = [dir_path]
+    while stack:
+        for entry in list_directory(stack.pop()).values():
+            if entry.name.startswith(".") or entry.is_symlink():
+                continue
+            if entry.is_dir():
+                stack.append(entry.path)
+            elif entry.is_file():
+                yield entry.path
+
+
+"""
+Function returns the root dir entries (files/dirs at
+the top of a root dir) that contain a pushed file or a
+file depending on one, answered from the pushed paths
+outward through the reverse dependency index ... the
+walk stops at the first impacted entry when any one
+settles the verdict
+param: root_dirs [list of primary paths]
+param: paths_to_be_pushed (iterable of repo relative paths)
+param: candidate_entries (set of entry paths) optional, the
+       entries whose impact settles the verdict, None == any
+return: (set) of entry paths, None if there is no index
+"""
+@traced("impact_query")
+def get_impacted_root_entries(root_dirs, paths_to_be_pushed, candidate_entries=None):
+    import sqlite3
+    dependency_index = get_dependency_index()
+    if not dependency_index:
+        return None
+    git_roots = [(f'{get_git_relative_path(root_dir)}/', root_dir) for root_dir in root_dirs]
+
+    def get_root_entries(impacted_path):
+        for git_root, root_dir in git_roots:
+            if impacted_path.startswith(git_root):
+                entry = impacted_path[len(git_root):].split("/", 1)[0]
+                yield os.path.join(root_dir, entry)
+
+    def settles_verdict(impacted_path):
+        return any(candidate_entries is None or entry_path in candidate_entries
+                   for entry_path in get_root_entries(impacted_path))
+
+    try:
+        dependency_index.refresh(get_indexed_dirs())
+        impacted_paths = dependency_index.get_impacted_paths(paths_to_be_pushed, settles_verdict)
+    except sqlite3.Error:
+        drop_dependency_index()
+        return None
+
+    impacted_entries = set()
+    for impacted_path in impacted_paths:
+        impacted_entries.update(get_root_entries(impacted_path))
+    return impacted_entries
+
+
+"""
+Function returns the path of the repository's git
+directory, where the hook keeps its caches ...
+return: git_dir (str) or None outside of a repo
+"""
+def get_git_directory():
+    git_dir = os.path.join(CONSTANTS["REPO_BASE_DIR"], ".git")
+    if os.path.isdir(git_dir):
+        return git_dir
+    # worktrees and submodules use a '.git' file, ask git
+    git_dir_stream = os.popen("git rev-parse --absolute-git-dir")
+    git_dir = git_dir_stream.readline().strip()
+    return git_dir if git_dir else None
+
+
+"""
+Function opens (once) the persistent dependency
+index under .git/ ... an index that cannot be
+opened is dropped, this run goes without caching
+return: DependencyIndex or None
+"""
+def get_dependency_index():
+    import sqlite3
+    global DEPENDENCY_INDEX
+    if DEPENDENCY_INDEX is None:
+        DEPENDENCY_INDEX = False
+        git_dir = get_git_directory()
+        if git_dir:
+            try:
+                index_path = os.path.join(git_dir, CONSTANTS["DEPENDENCY_INDEX_FILE"])
+                DEPENDENCY_INDEX = DependencyIndex(index_path)
+            except sqlite3.Error:
+                drop_dependency_index() # rebuilt by the next run
+    return DEPENDENCY_INDEX
+
+
+"""
+Function drops a dependency index that failed (locked,
+corrupt): it is closed and removed, so the next run
+builds it again, and this run goes on without one
+"""
+def drop_dependency_index():
+    import sqlite3
+    global DEPENDENCY_INDEX
+    if DEPENDENCY_INDEX:
+        try:
+            DEPENDENCY_INDEX.connection.close()
+        except sqlite3.Error:
+            pass
+    DEPENDENCY_INDEX = False
+    git_dir = get_git_directory()
+    if git_dir:
+        index_path = os.path.join(git_dir, CONSTANTS["DEPENDENCY_INDEX_FILE"])
+        for suffix in ("", "-journal", "-wal", "-shm"):
+            try:
+                os.remove(index_path + suffix)
+            except OSError:
+                pass
+
+
+"""
+Function writes the dependency index back to disk
+"""
+@traced("save_dependency_index")
+def save_dependency_index():
+    import sqlite3
+    if DEPENDENCY_INDEX:
+        try:
+            DEPENDENCY_INDEX.save()
+        except sqlite3.Error:
+            pass # a stale cache only costs re-parsing next time
+
+
+"""
+Dependency graph of the API tree for a single push
+A. nodes are paths: dir (namespace) nodes and file nodes
+B. a dir node's edges are its (non hidden, non symlink)
+   entries, a file node's edges are the files declaring
+   the namespaces of its EdgeZoneRP 'using' lines - each
+   parsed only once
+C. "reaches a pushed file" is memoized per node and is
+   computed per strongly connected component (Tarjan),
+   so files that 'using' each other cannot recurse
+   forever and every node/edge is visited only once
+"""
+class DependencyGraph:
+    def __init__(self, files_to_be_pushed):
+        self.files_to_be_pushed = files_to_be_pushed
+        self.edges = {} # node -> list of successor nodes
+        self.reaches_pushed = {} # node -> boolean (final)
+        self.previous_namespaces = None # declared by pushed files before the push
+
+    """
+    Method returns (and caches) the successors of node
+    param: node (str path)
+    return: (list) of successor nodes
+    """
+    def get_edges(self, node):
+        edges = self.edges.get(node)
+        if edges is None:
+            edges = []
+            entry = get_cached_entry(node)
+            if entry and entry.is_dir():
+                for child in list_directory(node).values():
+                    if not child.is_symlink() and not child.name.startswith("."):
+                        if child.is_dir() or child.is_file():
+                            edges.append(child.path)
+            elif entry and entry.is_file():
+                edges = parse_file_dependencies(node)
+            self.edges[node] = edges
+        return edges
+
+    """
+    Method checks whether node is a pushed file, or a dir
+    holding one - a trie lookup, no filesystem walk ... a file
+    using a namespace a pushed file declared before the push
+    (since renamed or deleted) counts too
+    param: node (str path)
+    return: boolean
+    """
+    def is_pushed_node(self, node):
+        entry = get_cached_entry(node)
+        if not entry:
+            return False
+        git_path = get_git_relative_path(node)
+        if entry.is_dir():
+            return self.files_to_be_pushed.contains_subtree(git_path)
+        if git_path in self.files_to_be_pushed:
+            return True
+        return self.uses_previous_namespace(node)
+
+    """
+    Method checks whether a file 'using's a namespace that
+    a pushed file declared before the push (see
+    get_previous_namespaces), or that a pushed, since
+    deleted, file most likely declared
+    param: node (str file path)
+    return: boolean
+    """
+    def uses_previous_namespace(self, node):
+        namespace_trie = get_namespace_trie()
+        if self.previous_namespaces is None:
+            self.previous_namespaces = get_previous_namespaces(self.files_to_be_pushed)
+            for git_path in self.files_to_be_pushed:
+                full_path = os.path.join(CONSTANTS["REPO_BASE_DIR"], *git_path.split("/"))
+                if get_cached_entry(full_path) is None:
+                    self.previous_namespaces.update(
+                        get_deleted_file_namespaces(git_path, namespace_trie))
+        if not self.previous_namespaces:
+            return False
+        dependency_lines = get_dependency_lines(node)
+        # the namespace may be gone completely: try every prefix of the target
+        for target in get_using_targets(dependency_lines):
+            segments = target.split(".")
+            for length in range(len(segments), 0, -1):
+                namespace = ".".join(segments[:length])
+                if namespace in self.previous_namespaces and namespace_trie.refers_to(target, namespace):
+                    return True
+        return False
+
+    """
+    Method returns whether node (or anything reachable
+    from it) is a pushed file. Iterative Tarjan: when a
+    component completes every member gets the same memoized
+    answer, later components reuse it without re-walking
+    param: node (str path)
+    return: boolean
+    """
+    def reaches_pushed_file(self, node):
+        if node in self.reaches_pushed:
+            return self.reaches_pushed[node]
+        # a pushed node needs no walk at all
+        if self.is_pushed_node(node):
+            self.reaches_pushed[node] = True
+            return True
+
+        index, lowlink, reach = {}, {}, {}
+        component_stack, on_stack = [], set()
+        work = []
+
+        def visit(visited_node):
+            index[visited_node] = lowlink[visited_node] = len(index)
+            reach[visited_node] = False # pushed nodes never get visited
+            component_stack.append(visited_node)
+            on_stack.add(visited_node)
+            work.append((visited_node, iter(self.get_edges(visited_node))))
+
+        visit(node)
+        while work:
+            check_deadline()
+            TRACER.record_max("dependency_graph_depth", len(work))
+            current, successors = work[-1]
+            descended = False
+            for successor in successors:
+                if successor in self.reaches_pushed:
+                    reach[current] = reach[current] or self.reaches_pushed[successor]
+                elif successor not in index and self.is_pushed_node(successor):
+                    self.reaches_pushed[successor] = True
+                    reach[current] = True
+                elif successor not in index:
+                    visit(successor)
+                    descended = True
+                    break
+                elif successor in on_stack:
+                    lowlink[current] = min(lowlink[current], index[successor])
+            if descended:
+                continue
+
+            work.pop()
+            # current is the root of a finished component
+            if lowlink[current] == index[current]:
+                component = []
+                while True:
+                    member = component_stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == current:
+                        break
+                component_reach = any(reach[member] for member in component)
+                for member in component:
+                    reach[member] = component_reach
+                    self.reaches_pushed[member] = component_reach
+            if work:
+                parent = work[-1][0]
+                lowlink[parent] = min(lowlink[parent], lowlink[current])
+                reach[parent] = reach[parent] or reach[current]
+        return self.reaches_pushed[node]
+
+
+"""
+Function returns the dependency graph for this push,
+so reachability is computed once per push ...
+param: files_to_be_pushed (PathTrie of files to be pushed)
+return: DependencyGraph
+"""
+def get_dependency_graph(files_to_be_pushed):
+    graph_key = (ANALYSIS_STATE["commit"], frozenset(files_to_be_pushed))
+    dependency_graph = DEPENDENCY_GRAPHS.get(graph_key)
+    if dependency_graph is None:
+        dependency_graph = DependencyGraph(files_to_be_pushed)
+        DEPENDENCY_GRAPHS[graph_key] = dependency_graph
+    return dependency_graph
+
+                                 
+"""
+A file/dir of a git tree, exposing the parts of
+the os.DirEntry interface the walks rely on
+"""
+class GitTreeEntry:
+    def __init__(self, name, path, mode, object_type, object_id):
+        self.name = name
+        self.path = path
+        self.mode = mode
+        self.object_type = object_type
+        self.object_id = object_id
+
+    def is_dir(self):
+        return self.object_type == "tree"
+
+    def is_file(self):
+        return self.object_type == "blob" and not self.is_symlink()
+
+    def is_symlink(self):
+        return self.mode == "120000"
+
+
+"""
+Function loads every directory listing of a commit's
+tree with a single 'git ls-tree' ... afterwards all
+walks run against the commit instead of the disk.
+Only tracked files are in a tree (.gitignore holds by
+itself), PRUNE_DIRECTORIES subtrees are left out
+param: commit (str object name)
+return: boolean, False when the commit cannot be read
+"""
+@traced("load_tree_listings")
+def load_tree_listings(commit):
+    if commit in TREE_LISTINGS:
+        return True
+    command = ["git", "ls-tree", "-r", "-t", "-z", "--full-tree", commit]
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                            cwd=CONSTANTS["REPO_BASE_DIR"])
+    if result.returncode != 0:
+        return False
+
+    base_dir = CONSTANTS["REPO_BASE_DIR"]
+    listings = {base_dir: {}}
+    prune_names = {os.fsencode(name) for name in CONSTANTS["PRUNE_DIRECTORIES"]}
+    pruned_prefix = None # a tree comes right before its content
+    for record in result.stdout.split(b"\0"):
+        if not record:
+            continue
+        # '<mode> <type> <object id>\t<repo relative path>'
+        metadata, _, git_path = record.partition(b"\t")
+        if pruned_prefix and git_path.startswith(pruned_prefix):
+            continue
+        mode, object_type, object_id = metadata.decode().split(" ")
+        if object_type == "tree" and git_path.rpartition(b"/")[2] in prune_names:
+            pruned_prefix = git_path + b"/"
+            continue
+        path = os.path.join(base_dir, *os.fsdecode(git_path).split("/"))
+        parent_dir, name = os.path.split(path)
+        listing = listings.setdefault(parent_dir, {})
+        listing[name] = GitTreeEntry(name, path, mode, object_type, object_id)
+        if object_type == "tree":
+            listings.setdefault(path, {})
+    TREE_LISTINGS[commit] = listings
+    TRACER.count("tree_directories_loaded", len(listings))
+    return True
+
+
+"""
+Function selects what the analysis reads: the pushed
+commit's objects (exact, works in bare repos and CI) or
+the working tree ... objects fall back to the working
+tree when the commit cannot be read
+param: local_oid (str) the commit being pushed, or None
+return: the analysed commit (str) or None for the working tree
+"""
+def select_analysis_source(local_oid):
+    ANALYSIS_STATE["commit"] = None
+    if CONSTANTS["ANALYSIS_SOURCE"] != "objects" or not local_oid:
+        return None
+    if local_oid == CONSTANTS["DELETE_PUSH_HASH_VALUE"]:
+        return None
+    if load_tree_listings(local_oid):
+        ANALYSIS_STATE["commit"] = local_oid
+    return ANALYSIS_STATE["commit"]
+
+
+"""
+Reads blobs through one long-lived 'git cat-file --batch'
+process, so every file the dependency analysis needs costs
+a pipe round trip instead of an open/cat process
+"""
+class GitBlobReader:
+    def __init__(self):
+        self.process = subprocess.Popen(["git", "cat-file", "--batch"],
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=subprocess.DEVNULL,
+                                        cwd=CONSTANTS["REPO_BASE_DIR"])
+
+    """
+    Method streams the content of a blob in chunks ... a
+    caller that stops early must close() the generator,
+    which drains the rest so the pipe stays in sync
+    param: object_id (str)
+    return: generator of bytes chunks
+    """
+    def iter_blob_chunks(self, object_id):
+        self.process.stdin.write(object_id.encode() + b"\n")
+        self.process.stdin.flush()
+        # '<object id> <type> <size>' or '<object id> missing'
+        header = self.process.stdout.readline().split()
+        if len(header) != 3:
+            return
+        remaining = int(header[2])
+        try:
+            while remaining > 0:
+                chunk = self.process.stdout.read(min(remaining, CONSTANTS["READ_CHUNK_SIZE"]))
+                if not chunk:
+                    return
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            while remaining > 0:
+                chunk = self.process.stdout.read(min(remaining, 1 << 16))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+            self.process.stdout.read(1) # the newline after every object
+
+
+"""
+Function returns (starting it once) the shared
+'git cat-file --batch' reader
+return: GitBlobReader
+"""
+def get_git_blob_reader():
+    global GIT_BLOB_READER
+    if GIT_BLOB_READER is None:
+        GIT_BLOB_READER = GitBlobReader()
+    return GIT_BLOB_READER
+
+
+"""
+Function returns the base directory every repository
+search starts from: the cwd, git runs hooks from the top
+of the working tree ... only a run from inside .git is
+cut back to it (other hidden dirs may well hold the
+checkout, e.g. ~/.work/repo)
+return: search_base_dir (str) None == abort
+"""
+def get_search_base_directory():
+    base_dir = os.getcwd()
+    git_dir_marker = f'{os.sep}.git'
+    marker_index = base_dir.find(git_dir_marker + os.sep)
+    if marker_index < 0 and base_dir.endswith(git_dir_marker):
+        marker_index = len(base_dir) - len(git_dir_marker)
+    if marker_index == 0:
+        return None
+    return base_dir if marker_index < 0 else base_dir[:marker_index]
+
+
+"""
+Function returns the untracked paths .gitignore rules
+ignore, a whole ignored dir as a single path ... asked
+once from git, which does not descend into those dirs
+return: (set) of full paths
+"""
+def get_ignored_paths():
+    if "ignored_paths" not in PROBE_RESULTS:
+        ignored_paths = set()
+        result = subprocess.run(["git", "ls-files", "-z", "--others", "--ignored",
+                                 "--exclude-standard", "--directory"],
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                cwd=CONSTANTS["REPO_BASE_DIR"])
+        if result.returncode == 0:
+            for git_path in result.stdout.split(b"\0"):
+                if git_path:
+                    # dirs come with a trailing '/'
+                    relative_path = os.fsdecode(git_path).rstrip("/")
+                    ignored_paths.add(os.path.join(CONSTANTS["REPO_BASE_DIR"],
+                                                   *relative_path.split("/")))
+        PROBE_RESULTS["ignored_paths"] = ignored_paths
+    return PROBE_RESULTS["ignored_paths"]
+
+
+"""
+Function lists dir_path once through os.scandir and
+caches the DirEntry objects, whose type information
+(is_dir/is_file/is_symlink) is reused by every later
+walk without further stat calls ... gitignored entries
+and PRUNE_DIRECTORIES dirs are left out, so no walk
+ever lists build output (bin/obj/packages ...)
+param: dir_path (str)
+return: (dict) entry name -> os.DirEntry
+"""
+def list_directory(dir_path):
+    # analysing the pushed commit: the listings come from its tree
+    analysis_commit = ANALYSIS_STATE["commit"]
+    if analysis_commit:
+        return TREE_LISTINGS.get(analysis_commit, {}).get(dir_path, {})
+    listing = DIRECTORY_LISTINGS.get(dir_path)
+    if listing is None:
+        listing = {}
+        TRACER.count("directories_listed")
+        prune_names = CONSTANTS["PRUNE_DIRECTORIES"]
+        ignored_paths = get_ignored_paths()
+        try:
+            with os.scandir(dir_path) as entries:
+                for entry in entries:
+                    if entry.path in ignored_paths:
+                        continue
+                    if entry.name in prune_names and entry.is_dir(follow_symlinks=False):
+                        continue
+                    listing[entry.name] = entry
+        except OSError:
+            pass # missing/unreadable dirs behave as empty
+        DIRECTORY_LISTINGS[dir_path] = listing
+    return listing
+
+
+"""
+Function returns the cached DirEntry for a path
+by looking it up in its parent's listing ...
+param: path (str)
+return: os.DirEntry (GitTreeEntry) or None if it does not exist
+"""
+def get_cached_entry(path):
+    parent_dir, name = os.path.split(path)
+    return list_directory(parent_dir).get(name)
+
+
+"""
+Function walks the repository a single time from
+search_base_dir and records everything the hook
+needs from the tree ...
+1. the swagger spec file (first match, depth first)
+2. every ROOT_DIRECTORIES match
+3. the listings of the root dirs and EXTENSIONS_BASE_DIR
+   subtrees, cached for the dependency walks
+Once 1. and 2. are found only those subtrees (and the
+path down to EXTENSIONS_BASE_DIR) are still walked.
+Only hardlinks are followed [symlinks are ignored]
+param: search_base_dir (str)
+return: (dict) with "swagger_file_path" and "root_dirs"
+"""
+def scan_repository(search_base_dir):
+    scan_key = (search_base_dir, ANALYSIS_STATE["commit"])
+    scan = REPOSITORY_SCANS.get(scan_key)
+    if scan is not None:
+        return scan
+
+    scan = {"swagger_file_path": None, "root_dirs": []}
+    root_names = CONSTANTS["ROOT_DIRECTORIES"]
+    extensions_base_dir = CONSTANTS.get("EXTENSIONS_BASE_DIR", "")
+    # depth first, (dir_path, inside a subtree we have to keep)
+    stack = [(search_base_dir, False)]
+    while stack:
+        check_deadline()
+        dir_path, in_subtree = stack.pop()
+        everything_found = (scan["swagger_file_path"] is not None
+                            and len(scan["root_dirs"]) == len(root_names))
+        on_extensions_path = extensions_base_dir.startswith(dir_path + os.sep)
+        if everything_found and not in_subtree and not on_extensions_path:
+            continue
+
+        child_dirs = []
+        for entry in list_directory(dir_path).values():
+            if scan["swagger_file_path"] is None and entry.name == CONSTANTS["SWAGGER_FILE_NAME"]:
+                if entry.is_file():
+                    scan["swagger_file_path"] = entry.path
+                    continue
+            if entry.name.startswith(".") or entry.is_symlink() or not entry.is_dir():
+                continue
+            child_in_subtree = in_subtree or entry.path == extensions_base_dir
+            if entry.name in root_names and len(scan["root_dirs"]) < len(root_names):
+                scan["root_dirs"].append(entry.path)
+                child_in_subtree = True
+            child_dirs.append((entry.path, child_in_subtree))
+        # reversed so the first listed entry is walked first
+        stack.extend(reversed(child_dirs))
+
+    REPOSITORY_SCANS[scan_key] = scan
+    return scan
+
+
+"""
+Function searches for the full_path of the
+swagger file... Could just hardcode this but
+what's the fun in it haha
+"""
+@traced("swagger_file_path")
+def get_swagger_file_path():
+    search_base_dir = get_search_base_directory()
+    if not search_base_dir:
+        return None
+    return search_for_swagger_file_path(search_base_dir)
+
+
+"""
+Function searches for swagger spec file
+from search_base_dir recursively ... Search
+only hardlinks [symlinks are ignored]
+param: search_base_dir
+return: swagger_file_path (str)
+"""
+def search_for_swagger_file_path(search_base_dir):
+    # shares the single repository walk with the root dir search
+    return scan_repository(search_base_dir)["swagger_file_path"]
+
+
+"""
+Function builds the roots directory paths
+we want to begin searching for updates to 
+API changes ... uses os.getcwd() etc...
+return root_dirs (array) None == abort
+"""
+@traced("root_directories")
+def get_root_directories():
+    search_base_dir = get_search_base_directory()
+    if not search_base_dir:
+        return None
+    # extract the actual base dir and reconstruct paths
+    # to the relevant classes: Attributes class/dir and 
+    # Controllers class/dir ...
+    root_dirs = []
+
+    # assumes that there exist a single unique folder by those names
+    # across the entire repository ....
+    dirs_to_found = len(CONSTANTS["ROOT_DIRECTORIES"])
+    search_for_root_directories(search_base_dir, root_dirs, dirs_to_found)
+    if len(root_dirs) == 0:
+        return None
+    return root_dirs
+
+
+"""
+Function searches for root directories
+from base_dir recursively ... We search
+only hardlinks [symlinks are ignored]
+param: base_dir
+param: root_dirs (list of relevant directories)
+param: dirs_to_found (num dirs to find)
+return: root_dirs (list)
+"""
+def search_for_root_directories(base_dir, root_dirs, dirs_to_found):
+    # shares the single repository walk with the swagger search
+    if dirs_to_found != 0:
+        root_dirs.extend(scan_repository(base_dir)["root_dirs"][:dirs_to_found])
+
+
+"""
+Prefix trie of repo relative paths ('/' separated)
+A. exact lookups answer "is this file pushed"
+B. prefix lookups answer "does subtree X contain a
+   pushed file" in O(depth), with no filesystem access
+"""
+class PathTrie:
+    PATH_END = "" # never a path segment
+
+    def __init__(self, paths=()):
+        self.root = {}
+        self.paths = set()
+        # set when reading stopped at a path that forces a rebuild,
+        # the trie then only holds the paths read up to it
+        self.rebuild_path = None
+        for path in paths:
+            self.add(path)
+
+    """
+    Method adds a repo relative path to the trie
+    param: path (str)
+    """
+    def add(self, path):
+        path = path.strip("/")
+        if not path or path in self.paths:
+            return
+        node = self.root
+        for segment in path.split("/"):
+            # segments repeat a lot in big pushes: share them
+            node = node.setdefault(sys.intern(segment), {})
+        node[PathTrie.PATH_END] = True
+        self.paths.add(sys.intern(path))
+
+    """
+    Method walks the trie down along path
+    param: path (str)
+    return: trie node (dict) or None
+    """
+    def find_node(self, path):
+        node = self.root
+        for segment in path.strip("/").split("/"):
+            node = node.get(segment)
+            if node is None:
+                return None
+        return node
+
+    """
+    Method checks whether some path lies below dir_path
+    param: dir_path (str repo relative dir)
+    return: boolean
+    """
+    def contains_subtree(self, dir_path):
+        if dir_path in ("", "."):
+            return bool(self.paths)
+        node = self.find_node(dir_path)
+        return bool(node) and any(segment != PathTrie.PATH_END for segment in node)
+
+    def __contains__(self, path):
+        node = self.find_node(path)
+        return bool(node) and PathTrie.PATH_END in node
+
+    def __iter__(self):
+        return iter(self.paths)
+
+    def __len__(self):
+        return len(self.paths)
+
+
+"""
+Function starts 'git <args> -z --name-status' (exact
+renames and copies detected, which costs no content
+comparison) with its output as a binary pipe
+param: args (list of git arguments, diff/log and revisions)
+return: subprocess.Popen
+"""
+def start_name_status_process(args):
+    command = ["git", args[0], "-z", "--name-status", "--find-renames=100%", *args[1:]]
+    return subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                            cwd=CONSTANTS["REPO_BASE_DIR"])
+
+
+"""
+Generator yielding the NUL separated fields of a binary
+stream, reading it a chunk at a time
+param: stream (binary file)
+return: generator of fields (bytes)
+"""
+def iter_nul_fields(stream):
+    remainder = b""
+    chunk_size = CONSTANTS["READ_CHUNK_SIZE"]
+    for chunk in iter(lambda: stream.read(chunk_size), b""):
+        fields = (remainder + chunk).split(b"\0")
+        remainder = fields.pop()
+        yield from fields
+    if remainder:
+        yield remainder
+
+
+"""
+Generator parsing '-z --name-status' output into
+NameStatusRecord, one record at a time, so a huge
+push list never sits in memory as a whole ... paths
+are taken byte for byte (no quoting, any encoding)
+and interned
+param: stream (binary file)
+return: generator of NameStatusRecord
+"""
+def iter_name_status_records(stream):
+    fields = iter_nul_fields(stream)
+    for field in fields:
+        field = field.lstrip(b"\n") # log ends its headers with a newline
+        if not field:
+            continue
+        if field.startswith(b"\x01"):
+            yield NameStatusRecord("commit", field[1:].decode(), None)
+            continue
+        status = field[:1].decode() # 'R100' -> 'R'
+        source_path = None
+        if status in ("R", "C"):
+            source_path = next(fields, None)
+            if source_path is None:
+                return
+            source_path = sys.intern(os.fsdecode(source_path))
+        path = next(fields, None)
+        if path is None:
+            return
+        yield NameStatusRecord(status, sys.intern(os.fsdecode(path)), source_path)
+
+
+"""
+Function returns the paths a record changes: both sides
+of a rename, only the new file of a copy
+param: record (NameStatusRecord)
+return: (tuple) of repo relative paths
+"""
+def get_record_paths(record):
+    if record.status == "R":
+        return (record.source_path, record.path)
+    return (record.path,)
+
+
+"""
+Function returns the files git push will be
+modifying, for every ref of the push at once ...
+1. one 'git log' lists the commits being pushed (not yet
+   on the remote) across all refs, with their parents
+   and the paths each of them touches
+2. each ref gets the union of the paths of the commits
+   reachable from its local_oid within that set
+param: push_refs (list of PushRef)
+param: remote_name (str) as given to the hook
+return: (list) of PathTrie, one per ref
+"""
+@traced("files_to_be_pushed")
+def get_files_to_be_pushed(push_refs, remote_name):
+    delete_hash = CONSTANTS["DELETE_PUSH_HASH_VALUE"]
+    tips = read_git_lines(["rev-parse", *[f'{push_ref.local_oid}^{{commit}}'
+                                          for push_ref in push_refs]], check=True)
+    if not tips or len(tips) != len(push_refs):
+        tips = [push_ref.local_oid for push_ref in push_refs]
+    remote_oids = [push_ref.remote_oid for push_ref in push_refs
+                   if push_ref.remote_oid != delete_hash]
+
+    # \x01 marks the commit headers, the records are NUL separated
+    process = start_name_status_process(["log", "--ignore-missing", "--format=%x01%H %P",
+                                         *tips, "--not", *remote_oids,
+                                         f'--remotes={remote_name}'])
+    commits = {} # commit -> (parents, paths)
+    current_paths = None
+    try:
+        for record in iter_name_status_records(process.stdout):
+            check_deadline()
+            if record.status == "commit":
+                commit, *parents = record.path.split(" ")
+                current_paths = []
+                commits[commit] = (parents, current_paths)
+            elif current_paths is not None:
+                current_paths.extend(get_record_paths(record))
+    except DeadlineExceeded:
+        process.kill()
+        raise
+    finally:
+        process.stdout.close()
+        process.wait()
+
+    files_by_ref = []
+    for tip in tips:
+        files_to_be_pushed = PathTrie()
+        stack, visited = [tip], set()
+        while stack:
+            commit = stack.pop()
+            if commit in visited or commit not in commits:
+                continue # already on the remote
+            visited.add(commit)
+            parents, paths = commits[commit]
+            for path in paths:
+                files_to_be_pushed.add(path)
+            stack.extend(parents)
+        files_by_ref.append(files_to_be_pushed)
+    return files_by_ref
+    
+
+"""
+Function returns the paths that differ between what the
+remote has and what each ref pushes (range mode) ...
+1. an updated ref: 'git diff remote_oid local_oid'
+2. a new ref (or a remote_oid we do not have): the diff
+   from the commit where local_oid leaves the remote's
+   history (the single boundary of the pushed commits),
+   every file when the history is entirely new
+3. several boundaries (merges of unpushed work): the paths
+   of every pushed commit, as in the heuristic mode
+The cost follows the size of the push, not the history
+(revision walks use git's commit-graph file when present)
+param: push_refs (list of PushRef)
+param: remote_name (str) as given to the hook
+param: stop_early (boolean) stop reading a ref's paths at the
+       first one forcing a rebuild (see get_rebuild_path_check)
+return: (list) of PathTrie, one per ref
+"""
+@traced("files_in_push_range")
+def get_files_in_push_range(push_refs, remote_name, stop_early=True):
+    delete_hash = CONSTANTS["DELETE_PUSH_HASH_VALUE"]
+    files_by_ref = []
+    for push_ref in push_refs:
+        forces_rebuild = get_rebuild_path_check(push_ref) if stop_early else lambda path: False
+        changed_paths = None
+        if push_ref.remote_oid != delete_hash:
+            changed_paths = read_changed_paths(push_ref.remote_oid, push_ref.local_oid,
+                                               forces_rebuild)
+        if changed_paths is None:
+            revisions = read_git_lines(["rev-list", "--boundary", push_ref.local_oid,
+                                        "--not", f'--remotes={remote_name}'])
+            boundaries = [revision[1:] for revision in revisions if revision.startswith("-")]
+            if len(boundaries) > 1:
+                files_by_ref.extend(get_files_to_be_pushed([push_ref], remote_name))
+                continue
+            # no boundary: none of its history is on the remote yet
+            base = boundaries[0] if boundaries else get_empty_tree()
+            changed_paths = read_changed_paths(base, push_ref.local_oid, forces_rebuild)
+        files_by_ref.append(changed_paths or PathTrie())
+    return files_by_ref
+
+
+"""
+Function streams the paths changed between two commits
+into a PathTrie, stopping at the first path that forces
+a rebuild on its own (the rest cannot change the verdict)
+param: base (str) commit/tree the remote has
+param: local_oid (str) commit being pushed
+param: forces_rebuild (function path -> boolean)
+return: PathTrie (rebuild_path set when it stopped early)
+        or None when git cannot diff the two
+"""
+def read_changed_paths(base, local_oid, forces_rebuild):
+    process = start_name_status_process(["diff", base, local_oid, "--"])
+    changed_paths = PathTrie()
+    try:
+        for record in iter_name_status_records(process.stdout):
+            check_deadline()
+            for path in get_record_paths(record):
+                changed_paths.add(path)
+                if forces_rebuild(path):
+                    changed_paths.rebuild_path = path
+                    return changed_paths
+    except DeadlineExceeded:
+        process.kill()
+        raise
+    finally:
+        if changed_paths.rebuild_path:
+            process.kill() # the rest of the list is not needed
+        process.stdout.close()
+        process.wait()
+    return changed_paths if process.returncode == 0 else None
+
+
+"""
+Function returns the check deciding, for the pushed
+commit of push_ref, whether a changed path forces a
+rebuild by itself: a file under a root dir (the swagger
+spec only does when its API surface changed, which
+check_for_api_range_changes looks at)
+param: push_ref (PushRef)
+return: function path (str repo relative) -> boolean
+"""
+def get_rebuild_path_check(push_ref):
+    select_analysis_source(push_ref.local_oid)
+    root_prefixes = tuple(f'{get_git_relative_path(root_dir)}/'
+                          for root_dir in get_root_directories() or [])
+    return lambda path: path.startswith(root_prefixes)
+
+
+"""
+Function returns the object name of the empty tree
+(of sha1 and sha256 repositories alike)
+return: object name (str)
+"""
+def get_empty_tree():
+    result = subprocess.run(["git", "hash-object", "-t", "tree", "--stdin"],
+                            input=b"", stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                            cwd=CONSTANTS["REPO_BASE_DIR"])
+    return result.stdout.decode().strip()
+
+
+"""
+Function returns the path to the 
+base directory ... hardcoded here
+as: .*\src\EdgeZoneRP\.*
+CHECK RETURN VALUE WHEN len(splitted_substrs) == 0
+return: base directory path for repo (str)
 """
 def save_extensions_base_directory_path():
-    base_dir = os.getcwd()
-    splitted_substrs = base_dir.split("\\.")
-    if len(splitted_substrs) == 0:
-        CONSTANTS["EXTENSIONS_BASE_DIR"] = base_dir # save non-null string [singular point of failure?]
-    search_base_dir = splitted_substrs[0]
+    search_base_dir = get_search_base_directory()
+    if not search_base_dir:
+        search_base_dir = os.getcwd() # save non-null string [singular point of failure?]
     CONSTANTS["REPO_BASE_DIR"] = search_base_dir
     # save this to the global constants file...
-    fullpath = f'{search_base_dir}\\{CONSTANTS["BASE_NAMESPACE_PATH"]}'
+    namespace_path = CONSTANTS["BASE_NAMESPACE_PATH"].replace("\\", os.sep)
+    fullpath = os.path.join(search_base_dir, namespace_path)
     CONSTANTS["EXTENSIONS_BASE_DIR"] = fullpath
 
 
+"""
+Remembers which builds already succeeded, keyed on the
+content that was built: the git trees of the build relevant
+paths plus the build command ... amending a commit message or
+pushing the same tree to another branch hits the same key.
+Only the BUILD_CACHE_SIZE most recently used keys are kept
+"""
+class BuildCache:
+    def __init__(self, cache_path):
+        import sqlite3
+        self.connection = sqlite3.connect(cache_path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS builds ("
+                                "key TEXT PRIMARY KEY, command TEXT, trees TEXT, "
+                                "built_at REAL, used_at REAL)")
+
+    """
+    Method checks for a successful build of key and
+    marks it as recently used
+    param: key (str)
+    return: boolean
+    """
+    def contains(self, key):
+        updated = self.connection.execute("UPDATE builds SET used_at = ? WHERE key = ?",
+                                          (time.time(), key))
+        self.connection.commit()
+        return updated.rowcount > 0
+
+    """
+    Method records a successful build and evicts the
+    least recently used ones beyond BUILD_CACHE_SIZE
+    param: key (str)
+    param: command (str) the build command
+    param: trees (str) the hashed trees, for inspection
+    """
+    def add(self, key, command, trees):
+        now = time.time()
+        self.connection.execute("INSERT OR REPLACE INTO builds VALUES (?, ?, ?, ?, ?)",
+                                (key, command, trees, now, now))
+        self.connection.execute("DELETE FROM builds WHERE key NOT IN ("
+                                "SELECT key FROM builds ORDER BY used_at DESC LIMIT ?)",
+                                (max(int(CONSTANTS["BUILD_CACHE_SIZE"]), 0),))
+        self.connection.commit()
+
+
+"""
+Function opens (once) the build cache under .git/ ...
+a cache that cannot be opened just disables it
+return: BuildCache or None
+"""
+def get_build_cache():
+    import sqlite3
+    global BUILD_CACHE
+    if BUILD_CACHE is None:
+        BUILD_CACHE = False
+        git_dir = get_git_directory()
+        if git_dir:
+            try:
+                BUILD_CACHE = BuildCache(os.path.join(git_dir, CONSTANTS["BUILD_CACHE_FILE"]))
+            except sqlite3.Error:
+                BUILD_CACHE = False
+    return BUILD_CACHE
+
+
+"""
+Function returns the build cache key of the pushed
+commits: the trees of their build relevant paths ... the
+build runs on the working tree, so the key is only known
+when it builds exactly those trees: the build relevant
+paths are clean and HEAD has the same trees
+param: build_command (str) what is going to run
+param: pushed_commits (list of str) the commits being rebuilt
+return: (key, trees) (str, str) or (None, None)
+"""
+def get_build_cache_key(build_command, pushed_commits):
+    import hashlib
+    if not pushed_commits:
+        return None, None
+    build_paths = CONSTANTS["BUILD_CACHE_PATHS"] or ["."]
+    git_paths = [get_git_relative_path(os.path.join(CONSTANTS["REPO_BASE_DIR"], path))
+                 for path in build_paths]
+    # local edits/untracked files would be built but are not in any tree
+    changes = read_git_lines(["status", "--porcelain", "--untracked-files=normal",
+                              "--", *git_paths], check=True)
+    if changes is None or changes:
+        return None, None
+    trees_by_commit = []
+    for commit in ["HEAD", *pushed_commits]:
+        trees = []
+        for git_path in git_paths:
+            # '<commit>:' is the root tree, a missing path resolves to nothing
+            revision = f'{commit}:{"" if git_path == "." else git_path}'
+            object_ids = read_git_lines(["rev-parse", "--verify", "-q", revision], check=True)
+            trees.append(f'{git_path} {object_ids[0] if object_ids else "-"}')
+        trees_by_commit.append(trees)
+    trees = trees_by_commit[0]
+    # pushing another branch than the one checked out: not what gets built
+    if any(pushed_trees != trees for pushed_trees in trees_by_commit[1:]):
+        return None, None
+    if not any(tree.split(" ")[1] != "-" for tree in trees):
+        return None, None
+    trees = "\n".join(trees)
+    key = hashlib.sha1(f'{build_command}\0{trees}'.encode()).hexdigest()
+    return key, trees
+
+
+"""
+Function reads the ProjectReference items of a project
+file (both sdk style and old msbuild xmlns projects)
+param: project_path (str repo relative .csproj path)
+return: (list) of repo relative referenced project paths
+"""
+def read_project_references(project_path):
+    import xml.etree.ElementTree as ElementTree
+    file_path = os.path.join(CONSTANTS["REPO_BASE_DIR"], *project_path.split("/"))
+    try:
+        root = ElementTree.parse(file_path).getroot()
+    except (OSError, ElementTree.ParseError):
+        return []
+    project_dir = posixpath.dirname(project_path)
+    references = []
+    for element in root.iter():
+        if not element.tag.endswith("ProjectReference"):
+            continue
+        include = element.get("Include", "")
+        if not include or "$(" in include:
+            continue # msbuild properties cannot be resolved here
+        reference = posixpath.normpath(posixpath.join(project_dir, include.replace("\\", "/")))
+        references.append(reference)
+    return references
+
+
+"""
+Function returns the projects a targeted build has to
+build for the affected files, in topological order ...
+1. every affected file maps to its owning project (the
+   project file in its closest parent directory), a file
+   outside every project is skipped unless it is a build
+   input of the whole tree (BUILD_INPUT_FILES)
+2. every project referencing an affected project, directly
+   or not, is affected too
+param: affected_paths (iterable of repo relative paths)
+return: (list) of repo relative .csproj paths, dependencies first,
+        (dict) project -> affected projects it references
+        or None when the whole tree has to be built
+"""
+def get_projects_to_build(affected_paths):
+    import fnmatch
+    project_paths = read_git_lines(["ls-files", "--", f':(glob)**/{CONSTANTS["PROJECT_FILE_PATTERN"]}'],
+                                   check=True)
+    if not project_paths:
+        return None
+    projects_by_dir = {}
+    for project_path in project_paths:
+        projects_by_dir.setdefault(posixpath.dirname(project_path), []).append(project_path)
+
+    # 1. owning project of every affected file
+    build_input_patterns = [pattern.lower() for pattern in CONSTANTS["BUILD_INPUT_FILES"]]
+    affected_projects = set()
+    for path in affected_paths:
+        owner_dir = posixpath.dirname(path)
+        while owner_dir not in projects_by_dir and owner_dir:
+            owner_dir = posixpath.dirname(owner_dir)
+        if owner_dir in projects_by_dir:
+            affected_projects.update(projects_by_dir[owner_dir])
+            continue
+        file_name = posixpath.basename(path).lower()
+        if any(fnmatch.fnmatchcase(file_name, pattern) for pattern in build_input_patterns):
+            # e.g. build.proj/Directory.Build.props changes: build everything
+            return None
+        # anything else (docs, README ...) is built by no project
+    if not affected_projects:
+        return None # a rebuild with nothing to target: build everything
+
+    # 2. projects depending on an affected project
+    references = {project_path: read_project_references(project_path)
+                  for project_path in project_paths}
+    dependents = {}
+    for project_path, referenced_paths in references.items():
+        for referenced_path in referenced_paths:
+            dependents.setdefault(referenced_path, []).append(project_path)
+    stack = list(affected_projects)
+    while stack:
+        for dependent in dependents.get(stack.pop(), []):
+            if dependent not in affected_projects:
+                affected_projects.add(dependent)
+                stack.append(dependent)
+
+    # dependencies first (Kahn), cycles are left to msbuild
+    build_dependencies = {project_path: [reference for reference in references[project_path]
+                                         if reference in affected_projects]
+                          for project_path in affected_projects}
+    ordered_projects = []
+    remaining = {project_path: set(dependencies)
+                 for project_path, dependencies in build_dependencies.items()}
+    while remaining:
+        ready = sorted(project_path for project_path, dependencies in remaining.items()
+                       if not dependencies)
+        if not ready:
+            ready = sorted(remaining)
+        for project_path in ready:
+            del remaining[project_path]
+        for dependencies in remaining.values():
+            dependencies.difference_update(ready)
+        ordered_projects.extend(ready)
+    return ordered_projects, build_dependencies
+
+
+"""
+One step of a build: a shell command (restore or build of
+a project, or of the whole tree) that only starts once every
+step named in requires finished successfully
+"""
+BuildStep = namedtuple("BuildStep", ["name", "command", "requires"])
+
+
+"""
+Function turns what has to be built into build steps ...
+restores need nothing, so they run while earlier projects
+still build, and a project's build waits for its restore
+and for the builds of the affected projects it references
+(a reference cycle is broken by the topological order)
+param: projects (ordered_projects, build_dependencies) or None for the whole tree
+return: (list) of BuildStep, in the order they should start
+"""
+def get_build_steps(projects):
+    import shlex
+    if not projects:
+        steps = []
+        restore_command = CONSTANTS["EDGEZONERP_RESTORE_CMD"]
+        if restore_command:
+            steps.append(BuildStep("restore", restore_command, ()))
+        steps.append(BuildStep("build", CONSTANTS["EDGEZONERP_BUILD_CMD"],
+                               ("restore",) if restore_command else ()))
+        return steps
+
+    ordered_projects, build_dependencies = projects
+    position = {project_path: index for index, project_path in enumerate(ordered_projects)}
+    steps = []
+    for project_path in ordered_projects:
+        quoted_path = shlex.quote(project_path)
+        requires = [f'build {dependency}' for dependency in build_dependencies.get(project_path, [])
+                    if position[dependency] < position[project_path]]
+        if CONSTANTS["PROJECT_RESTORE_CMD"]:
+            steps.append(BuildStep(f'restore {project_path}',
+                                   CONSTANTS["PROJECT_RESTORE_CMD"].format(project=quoted_path), ()))
+            requires.append(f'restore {project_path}')
+        steps.append(BuildStep(f'build {project_path}',
+                               CONSTANTS["PROJECT_BUILD_CMD"].format(project=quoted_path),
+                               tuple(requires)))
+    return steps
+
+
+"""
+Function reads the output of a build step line by line
+(runs on its own thread, one per step) and hands every
+line over to the thread printing them
+param: step_name (str)
+param: stream (binary pipe) stdout+stderr of the step
+param: output_lines (queue.Queue) of (step_name, line)
+"""
+def stream_build_output(step_name, stream, output_lines):
+    with stream:
+        for line in stream:
+            output_lines.put((step_name, line.decode(errors="replace").rstrip()))
+
+
+"""
+Function stops a build step and whatever it started
+(each step runs in its own process group on posix)
+param: process (subprocess.Popen)
+"""
+def stop_build_process(process):
+    import signal
+    try:
+        if os.name == "posix":
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except OSError:
+        pass # already gone
+
+
+"""
+Function runs build steps as a pool of up to BUILD_JOBS
+subprocesses ...
+1. a step starts as soon as the steps it requires succeeded
+2. the output of every step is streamed as it comes, each
+   line prefixed with the build time and the step name
+3. the whole build is stopped once BUILD_TIMEOUT_SECONDS
+   are spent (a hung build would otherwise hang the push)
+4. the first failure stops new steps from starting, the
+   running ones finish
+Every step is recorded with the tracer (category "build")
+param: steps (list of BuildStep)
+return: exit status: 0, the first failing step's status (128 +
+        signal when killed) or 124 when the time ran out
+"""
+def run_build_steps(steps):
+    import queue, threading
+    jobs = max(int(CONSTANTS["BUILD_JOBS"]), 1)
+    timeout = CONSTANTS["BUILD_TIMEOUT_SECONDS"]
+    build_started = time.perf_counter()
+    deadline = build_started + timeout if timeout else None
+    output_lines = queue.Queue()
+    pending = list(steps)
+    succeeded = set()
+    running = {} # Popen -> (step, started, job, output reader)
+    free_jobs = list(range(jobs - 1, -1, -1))
+    exit_status = 0
+
+    def print_line(step_name, line):
+        print(f'[{time.perf_counter() - build_started:7.1f}s] {step_name}: {line}', flush=True)
+
+    def print_output():
+        while not output_lines.empty():
+            print_line(*output_lines.get())
+
+    try:
+        while pending or running:
+            # 1. start every step whose requirements are met
+            for step in list(pending):
+                if exit_status or not free_jobs:
+                    break
+                if all(requirement in succeeded for requirement in step.requires):
+                    pending.remove(step)
+                    print(f'Starting {step.name} ...', flush=True)
+                    process = subprocess.Popen(step.command, shell=True, cwd=CONSTANTS["REPO_BASE_DIR"],
+                                               stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                               stderr=subprocess.STDOUT, start_new_session=True)
+                    reader = threading.Thread(target=stream_build_output,
+                                              args=(step.name, process.stdout, output_lines),
+                                              daemon=True)
+                    reader.start()
+                    running[process] = (step, time.perf_counter(), free_jobs.pop(), reader)
+            if not running:
+                break # a failure, or steps requiring steps that never ran
+
+            # 2. stream the output until some step finishes
+            try:
+                print_line(*output_lines.get(timeout=0.05))
+            except queue.Empty:
+                pass
+            print_output()
+
+            for process in [process for process in running if process.poll() is not None]:
+                step, started, job, reader = running.pop(process)
+                process.wait() # (lets the tracer see the subprocess end)
+                reader.join(1) # the rest of its output, unless a child keeps the pipe
+                print_output()
+                free_jobs.append(job)
+                duration = time.perf_counter() - started
+                status = process.returncode if process.returncode >= 0 else 128 - process.returncode
+                TRACER.add_event("build", step.name, started, duration,
+                                 {"command": step.command, "exit_status": status, "job": job})
+                if status == 0:
+                    succeeded.add(step.name)
+                    print(f'Finished {step.name} in {duration:.1f}s', flush=True)
+                else:
+                    print(f'{step.name} failed with exit status {status}', flush=True)
+                    exit_status = exit_status or status
+
+            # 3. the time budget
+            if deadline and time.perf_counter() > deadline and running:
+                print(f'Build stopped after {timeout}s, '
+                      f'{len(running)} step(s) still running', flush=True)
+                exit_status = 124
+                break
+    finally:
+        # timeout or interrupt: nothing outlives the hook
+        for process, (step, started, job, reader) in running.items():
+            stop_build_process(process)
+            process.wait()
+            TRACER.add_event("build", step.name, started, time.perf_counter() - started,
+                             {"command": step.command, "exit_status": None, "job": job})
+        print_output()
+    if not exit_status and pending:
+        exit_status = 1 # never started
+    return exit_status
+
+
 """
 Function initiates rebuild by running
 command: dotnet build build.proj
+or, for targeted builds, only the affected projects
+A build that already succeeded for the very same
+content (see BuildCache) is not run again
+param: rebuild (boolean)
+param: affected_paths (iterable of repo relative paths) or None
+param: pushed_commits (list of str) the commits being rebuilt,
+       what the build cache is keyed on
+return: exit status of the build (0 when nothing was built)
 """
-def handle_push(rebuild):
+@traced("handle_push")
+def handle_push(rebuild, affected_paths=None, pushed_commits=()):
+    import sqlite3
     if rebuild:
         print("Project needs to be rebuilt to validate API changes")
+        projects = None
+        if CONSTANTS["TARGETED_BUILDS"] and affected_paths:
+            projects = get_projects_to_build(affected_paths)
+        steps = get_build_steps(projects)
+        build_command = "\n".join(step.command for step in steps)
+        build_cache = get_build_cache()
+        cache_key, trees = (get_build_cache_key(build_command, pushed_commits)
+                            if build_cache else (None, None))
+        try:
+            if cache_key and build_cache.contains(cache_key):
+                print("Rebuild skipped, this exact tree already built successfully :)")
+                return 0
+        except sqlite3.Error:
+            cache_key = None # no cache, just build
         print("Rebuild initiated ...")
-        # change directory into the base directory
-        os.system(f'cd {CONSTANTS["REPO_BASE_DIR"]}')
-        # run the build command from the new path ...
-        result = os.system(f'{CONSTANTS["EDGEZONERP_BUILD_CMD"]}')
+        if projects:
+            print(f'Building {len(projects[0])} affected project(s)')
+        result = run_build_steps(steps)
         if result == 0:
             print("Rebuild successful :)")
+            if cache_key:
+                try:
+                    build_cache.add(cache_key, build_command, trees)
+                except sqlite3.Error:
+                    pass # the next push just builds again
         else:
-            print("Attempt to rebuild project failed :(")
+            print(f'Attempt to rebuild project failed (exit status {result}) :(')
+        return result
     else:
         print("Rebuild not necessary :)")
+        return 0
+
+"""
+Function runs the rebuild decision for a push
+in-process (also used by the index daemon) ...
+param: files_to_be_pushed (PathTrie of files to be pushed)
+return: rebuild (boolean) or None when no root dirs exist
+"""
+def evaluate_push(files_to_be_pushed):
+    if ANALYSIS_STATE["decision_mode"] == "range":
+        return evaluate_push_range(files_to_be_pushed)
+    # get the relevant paths and directories to init query
+    swagger_filepath = get_swagger_file_path()
+    root_dirs = get_root_directories()
+    swagger_most_recent_mod = get_swagger_modified_datetime(swagger_filepath)
+    global_most_recent_push = get_most_recent_push_datetime()
+
+    # print("swagger_path: " + swagger_filepath)
+    # print("root_dirs: ", root_dirs)
+    # print("files_to_be_pushed: ", files_to_be_pushed)
+    # print("swagger_mod_dt: ", swagger_most_recent_mod)
+    # print("most_recent_push: ", global_most_recent_push)
+
+    # only proceed if root_dirs != None
+    if not root_dirs:
+        return None
+    rebuild = check_for_api_committed_changes(root_dirs, 
+                                              swagger_most_recent_mod, 
+                                              global_most_recent_push,
+                                              files_to_be_pushed)
+    save_dependency_index()
+    return rebuild
+
+
+"""
+Function runs the rebuild decision of the range mode:
+files_to_be_pushed is exactly what the push changes
+(see get_files_in_push_range), so no dates are involved
+and the same push always gets the same verdict
+param: files_to_be_pushed (PathTrie of changed files)
+return: rebuild (boolean) or None when no root dirs exist
+"""
+def evaluate_push_range(files_to_be_pushed):
+    root_dirs = get_root_directories()
+    if not root_dirs:
+        return None
+    if files_to_be_pushed.rebuild_path:
+        return True # decided while the changed paths were read
+    rebuild = check_for_api_range_changes(root_dirs, get_swagger_file_path(), files_to_be_pushed)
+    save_dependency_index()
+    return rebuild
+
+
+"""
+Function classifies one changed line of a C# hunk
+param: line (str) without its +/- marker
+param: in_block_comment (boolean) state from the hunk's previous
+       line (or from above the hunk, see get_hunk_comment_states)
+return: (kind, code, in_block_comment): kind is "whitespace",
+        "comment", "using" or "code", code is the line without
+        its comments (string literals kept)
+"""
+def classify_changed_line(line, in_block_comment):
+    stripped = line.strip()
+    if not stripped:
+        return "whitespace", "", in_block_comment
+    code, in_block_comment = strip_comments(line, in_block_comment, keep_literals=True)
+    code = code.strip()
+    if not code or REGION_PATTERN.match(code):
+        return "comment", "", in_block_comment
+    statement, separator, rest = code.partition(";")
+    if separator and not rest.strip() and USING_DIRECTIVE_PATTERN.match(statement.strip()):
+        return "using", code, in_block_comment
+    return "code", code, in_block_comment
+
+
+"""
+Function tells whether a hunk of a C# file changes code:
+the code left on its removed lines and on its added lines
+(comments and whitespace dropped, see classify_changed_line)
+differs, or a using directive changed (what the file depends
+on, always relevant) ... so a comment edited next to code or
+code re-wrapped over other lines is no code change
+param: removed_lines (list of str) without the '-' marker
+param: added_lines (list of str) without the '+' marker
+param: comment_states (boolean, boolean) whether each side starts
+       inside a /* */ block (see get_hunk_comment_states)
+return: boolean, None when a side ends in another /* */ state than
+        it started in, or than the other side ends in: the lines
+        below the hunk read differently, only the whole blobs
+        tell (see blobs_change_code)
+"""
+def hunk_changes_code(removed_lines, added_lines, comment_states=(False, False)):
+    sides = []
+    end_states = []
+    for lines, in_block_comment in zip((removed_lines, added_lines), comment_states):
+        code = []
+        for line in lines:
+            kind, line_code, in_block_comment = classify_changed_line(line, in_block_comment)
+            if kind == "using":
+                return True
+            code.append("".join(line_code.split()))
+        sides.append("".join(code))
+        end_states.append(in_block_comment)
+    if tuple(end_states) != tuple(comment_states) or end_states[0] != end_states[1]:
+        return None
+    return sides[0] != sides[1]
+
+
+"""
+Function tells whether two blobs of a C# file differ in
+code: what is left of them once comments and whitespace
+are dropped (see classify_changed_line), using directives
+included ... for the files whose hunks cannot tell
+param: blob_pair (old blob id, new blob id)
+return: boolean
+"""
+def blobs_change_code(blob_pair):
+    sides = []
+    for object_id in blob_pair:
+        code = []
+        in_block_comment = False
+        chunks = get_git_blob_reader().iter_blob_chunks(object_id)
+        try:
+            for line in iter_decoded_lines(chunks):
+                check_deadline()
+                _, line_code, in_block_comment = classify_changed_line(line, in_block_comment)
+                code.append("".join(line_code.split()))
+        finally:
+            chunks.close()
+        sides.append("".join(code))
+    return sides[0] != sides[1]
+
+
+"""
+Function tells whether a line of a blob lies inside a
+/* */ block comment opened above it, by reading the
+blob up to that line
+param: object_id (str) blob
+param: line_number (int) 1 based
+return: boolean, False when the blob cannot be read
+"""
+def starts_in_block_comment(object_id, line_number):
+    if line_number <= 1 or not object_id.strip("0"):
+        return False
+    in_block_comment = False
+    chunks = get_git_blob_reader().iter_blob_chunks(object_id)
+    try:
+        for current_line, line in enumerate(iter_decoded_lines(chunks), 1):
+            if current_line >= line_number:
+                break
+            _, in_block_comment = strip_comments(line, in_block_comment)
+    finally:
+        chunks.close()
+    return in_block_comment
+
+
+"""
+Function tells, for both sides of a -U0 hunk, whether it
+starts inside a /* */ block comment ... a hunk has no context
+lines, so the blob is read up to the hunk, but only for a side
+that looks like it could ('* text' first, or a '*/'). Anything
+else starts outside of one: a changed line that only looks
+like a comment continuation ('* rate;') stays code
+param: blob_pair (old blob id, new blob id)
+param: start_lines (old start line, new start line) of the hunk
+param: removed_lines (list of str) without the '-' marker
+param: added_lines (list of str) without the '+' marker
+return: (boolean, boolean)
+"""
+def get_hunk_comment_states(blob_pair, start_lines, removed_lines, added_lines):
+    comment_states = []
+    for object_id, start_line, lines in zip(blob_pair, start_lines, (removed_lines, added_lines)):
+        may_continue_comment = bool(lines) and bool(
+            COMMENT_CONTINUATION_PATTERN.match(lines[0].strip())
+            or any("*/" in line for line in lines))
+        comment_states.append(may_continue_comment
+                              and starts_in_block_comment(object_id, start_line))
+    return tuple(comment_states)
+
+
+"""
+Function streams 'git diff -U0 -w' of a push over the API
+pathspecs (see get_api_pathspecs) and tells whether any
+hunk changes code ...
+1. a hunk of a C# file is checked by hunk_changes_code:
+   comment and whitespace edits are not relevant ... a hunk
+   opening or closing a /* */ block that carries past it
+   gets the whole file compared (see blobs_change_code)
+2. the swagger spec is relevant when its API surface changed
+   (see is_swagger_surface_pushed), its hunks are not read
+3. any change to another file (project files ...), a mode
+   change or a binary change is relevant
+4. the answer for every file is cached per blob pair, the
+   hunks of a known pair are skipped
+The diff is stopped at the first relevant change
+param: base (str) commit
+param: local_oid (str) commit
+return: (boolean) True when code changed, None when git failed
+"""
+@traced("hunk_filter")
+def push_changes_code(base, local_oid):
+    import itertools
+    command = ["git", "-c", "core.quotePath=false", "diff", "-U0", "-w", "--ignore-blank-lines",
+               "--no-color", "--no-ext-diff", "--no-renames", "--full-index",
+               base, local_oid, "--", *get_api_pathspecs()]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                               cwd=CONSTANTS["REPO_BASE_DIR"])
+    swagger_file_path = get_swagger_file_path()
+    swagger_header = None
+    if swagger_file_path:
+        swagger_path = get_git_relative_path(swagger_file_path)
+        swagger_header = f'diff --git a/{swagger_path} b/{swagger_path}'
+    changes_code = False
+    blob_pair = None # of the file being read, None once its answer is known
+    is_source = False
+    is_swagger = False
+    in_header = False
+    hunk = None # (removed lines, added lines, start lines) of the hunk being read
+    try:
+        # the None after the last line closes the last hunk and file
+        for raw_line in itertools.chain(process.stdout, [None]):
+            check_deadline()
+            line = raw_line.decode("utf-8", errors="replace").rstrip("\r\n") if raw_line else ""
+            file_changes_code = False
+            if hunk and (raw_line is None or line.startswith(("@@", "diff --git "))):
+                removed_lines, added_lines, start_lines = hunk
+                file_changes_code = hunk_changes_code(
+                    removed_lines, added_lines,
+                    get_hunk_comment_states(blob_pair, start_lines, removed_lines, added_lines))
+                hunk = None
+                if file_changes_code is None:
+                    # the rest of the file reads differently: compare all of it
+                    file_changes_code = blobs_change_code(blob_pair)
+                    HUNK_RELEVANCE[blob_pair] = file_changes_code
+                    blob_pair = None # its other hunks cannot change the answer
+            if file_changes_code:
+                pass # decided by the hunk that just ended
+            elif raw_line is None or line.startswith("diff --git "):
+                if blob_pair:
+                    HUNK_RELEVANCE[blob_pair] = False # every hunk was read
+                blob_pair = None
+                in_header = True
+                is_source = line.rstrip('"').endswith(".cs")
+                is_swagger = line == swagger_header
+            elif in_header and line.startswith("index "):
+                blob_pair = tuple(line.split(" ")[1].split(".."))
+                if is_swagger:
+                    # decided by its API surface, not by its lines
+                    file_changes_code = is_swagger_surface_pushed() is not False
+                    blob_pair = None
+                elif blob_pair in HUNK_RELEVANCE:
+                    file_changes_code = HUNK_RELEVANCE[blob_pair]
+                    blob_pair = None # nothing left to learn from its hunks
+            elif in_header and line.startswith(("old mode ", "new mode ", "Binary files ")):
+                file_changes_code = True
+            elif line.startswith("@@"):
+                in_header = False
+                hunk_header = HUNK_HEADER_PATTERN.match(line)
+                if blob_pair and hunk_header:
+                    hunk = ([], [], (int(hunk_header["old"]), int(hunk_header["new"])))
+                elif blob_pair:
+                    file_changes_code = True # not a hunk we can read
+            elif hunk and line[:1] in ("+", "-"):
+                if not is_source:
+                    file_changes_code = True
+                else:
+                    hunk[0 if line[0] == "-" else 1].append(line[1:])
+            if file_changes_code:
+                if blob_pair:
+                    HUNK_RELEVANCE[blob_pair] = True
+                changes_code = True
+                break
+    except DeadlineExceeded:
+        process.kill()
+        raise
+    finally:
+        if changes_code:
+            process.kill() # the rest of the diff is not needed
+        process.stdout.close()
+        process.wait()
+    if not changes_code and process.returncode != 0:
+        return None
+    return changes_code
+
+
+"""
+Function runs the rebuild decision for every ref
+of a push ... the walk, the index, the swagger lookup
+and the git probes are shared, only the analysed commit
+(objects mode) and the pushed paths differ per ref
+param: push_refs (list of PushRef)
+param: files_by_ref (list of PathTrie, one per ref)
+param: worktree_commit (str) optional, a commit the working tree
+       holds unchanged: refs pushing it are analysed from the
+       working tree (the state the index daemon keeps warm)
+return: (list) of rebuild verdicts (boolean or None), one per ref
+"""
+def evaluate_push_refs(push_refs, files_by_ref, worktree_commit=None):
+    verdicts = []
+    for push_ref, files_to_be_pushed in zip(push_refs, files_by_ref):
+        DECISION_DEADLINE["decided_refs"] = len(verdicts)
+        if worktree_commit and push_ref.local_oid == worktree_commit:
+            select_analysis_source(None)
+        else:
+            select_analysis_source(push_ref.local_oid)
+        ANALYSIS_STATE["push_range"] = (push_ref.remote_oid, push_ref.local_oid)
+        rebuild = evaluate_push(files_to_be_pushed)
+        if rebuild and CONSTANTS["HUNK_FILTER"] and push_ref.remote_oid.strip("0"):
+            # comment/whitespace only edits of the API files need no build
+            enter_decision_stage("hunk filter")
+            rebuild = push_changes_code(push_ref.remote_oid, push_ref.local_oid) is not False
+        verdicts.append(rebuild)
+    return verdicts
+
+
+"""
+Function returns the path of the index daemon's
+unix domain socket (under .git/) ...
+return: socket_path (str) or None
+"""
+def get_daemon_socket_path():
+    import socket
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+    git_dir = get_git_directory()
+    if not git_dir:
+        return None
+    return os.path.join(git_dir, CONSTANTS["DAEMON_SOCKET_FILE"])
+
+
+"""
+Function asks a running index daemon for the
+rebuild verdicts of this push ... any failure
+(no daemon, timeout, bad reply) returns None so
+the hook falls back to the in-process path
+param: push_refs (list of PushRef)
+param: files_by_ref (list of PathTrie, one per ref)
+return: (list) of verdicts (boolean or None), one per ref, or None
+"""
+@traced("query_index_daemon")
+def query_index_daemon(push_refs, files_by_ref):
+    import json, socket
+    socket_path = get_daemon_socket_path()
+    if not socket_path or not os.path.exists(socket_path):
+        return None
+    request = json.dumps({"mode": ANALYSIS_STATE["decision_mode"],
+                          "refs": [{"local_oid": push_ref.local_oid,
+                                    "remote_oid": push_ref.remote_oid,
+                                    "paths": sorted(files_to_be_pushed)}
+                                   for push_ref, files_to_be_pushed
+                                   in zip(push_refs, files_by_ref)]}) + "\n"
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            remaining = get_deadline_remaining()
+            client.settimeout(CONSTANTS["DAEMON_TIMEOUT_SECONDS"] if remaining is None
+                              else min(CONSTANTS["DAEMON_TIMEOUT_SECONDS"], remaining))
+            client.connect(socket_path)
+            client.sendall(request.encode())
+            reply = client.makefile("rb").readline()
+        verdict = json.loads(reply)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(verdict, dict) or not isinstance(verdict.get("rebuild"), list):
+        return None
+    if len(verdict["rebuild"]) != len(push_refs):
+        return None
+    return verdict["rebuild"]
+
+
+"""
+Minimal inotify binding (ctypes, linux only) used by
+the index daemon to learn which dirs/files changed
+"""
+class InotifyWatcher:
+    IN_MODIFY      = 0x00000002
+    IN_ATTRIB      = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM  = 0x00000040
+    IN_MOVED_TO    = 0x00000080
+    IN_CREATE      = 0x00000100
+    IN_DELETE      = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF   = 0x00000800
+    IN_Q_OVERFLOW  = 0x00004000
+    IN_IGNORED     = 0x00008000
+    IN_ISDIR       = 0x40000000
+    IN_NONBLOCK    = 0o4000
+    IN_CLOEXEC     = 0o2000000
+    WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+                  | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+
+    def __init__(self):
+        import ctypes, ctypes.util, struct
+        self.struct = struct
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watched_dirs = {} # watch descriptor -> dir path
+        self.watch_descriptors = {} # dir path -> watch descriptor
+
+    """
+    Method watches dir_path (and, if recursive, every
+    non hidden dir below it) ... already watched dirs
+    are skipped
+    param: dir_path (str)
+    param: recursive (boolean)
+    """
+    def watch(self, dir_path, recursive=True):
+        stack = [dir_path]
+        while stack:
+            current = stack.pop()
+            if current not in self.watch_descriptors:
+                descriptor = self.libc.inotify_add_watch(self.fd, os.fsencode(current),
+                                                         self.WATCH_MASK)
+                if descriptor < 0:
+                    continue # vanished, or the watch limit is reached
+                self.watched_dirs[descriptor] = current
+                self.watch_descriptors[current] = descriptor
+            if recursive:
+                for entry in list_directory(current).values():
+                    if entry.is_dir() and not entry.is_symlink() and not entry.name.startswith("."):
+                        stack.append(entry.path)
+
+    """
+    Method drains every pending event without blocking
+    return: (list) of (dir_path, name, mask), dir_path is
+            None when the kernel queue overflowed
+    """
+    def read_events(self):
+        events = []
+        while True:
+            try:
+                buffer = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return events
+            offset = 0
+            while offset < len(buffer):
+                descriptor, mask, _, name_length = self.struct.unpack_from("iIII", buffer, offset)
+                offset += 16
+                name = buffer[offset:offset + name_length].rstrip(b"\0")
+                offset += name_length
+                if mask & self.IN_Q_OVERFLOW:
+                    events.append((None, "", mask))
+                    continue
+                dir_path = self.watched_dirs.get(descriptor)
+                if mask & self.IN_IGNORED:
+                    # the watch is gone (dir deleted/moved)
+                    self.watched_dirs.pop(descriptor, None)
+                    self.watch_descriptors.pop(dir_path, None)
+                    continue
+                if dir_path is not None:
+                    events.append((dir_path, os.fsdecode(name), mask))
+
+
+"""
+Function keeps the commit keyed caches (tree listings,
+namespace tries, repository scans) of the most recently
+analysed DAEMON_CACHED_COMMITS commits only ... a commit's
+tree never changes, so the daemon reuses them across
+requests instead of listing the same tree again
+param: used_commits (list of commits the request analysed)
+"""
+def trim_commit_caches(used_commits):
+    for commit in used_commits:
+        if commit in TREE_LISTINGS:
+            TREE_LISTINGS[commit] = TREE_LISTINGS.pop(commit) # most recently used last
+    stale_count = max(0, len(TREE_LISTINGS) - CONSTANTS["DAEMON_CACHED_COMMITS"])
+    for commit in list(TREE_LISTINGS)[:stale_count]:
+        del TREE_LISTINGS[commit]
+    for commit in [commit for commit in NAMESPACE_TRIES if commit not in TREE_LISTINGS]:
+        del NAMESPACE_TRIES[commit]
+    for scan_key in [scan_key for scan_key in REPOSITORY_SCANS
+                     if scan_key[1] and scan_key[1] not in TREE_LISTINGS]:
+        del REPOSITORY_SCANS[scan_key]
+
+
+"""
+Long-running index daemon (python pre-push.py --daemon)
+It keeps the repository scan (root dirs, swagger path),
+the directory listings and the dependency index warm in
+memory, invalidates them from inotify events, and answers
+the hook's verdict requests on a unix domain socket ...
+a push of HEAD, while the watched paths are clean, is
+analysed from that warm working tree state, any other
+commit from its git objects
+One JSON line per request:
+{"mode": ..., "refs": [{"local_oid": ..., "remote_oid": ..., "paths": [...]}]}
+and one JSON line per reply: {"rebuild": [true/false/null per ref]}
+return: exit status (int)
+"""
+def run_index_daemon():
+    import json, selectors, signal, socket, sqlite3
+    save_extensions_base_directory_path()
+    socket_path = get_daemon_socket_path()
+    if not socket_path:
+        print("pre-push daemon: unix domain sockets are not available")
+        return 1
+    try:
+        watcher = InotifyWatcher()
+    except (OSError, AttributeError):
+        print("pre-push daemon: inotify is not available on this platform")
+        return 1
+    # refuse to run twice, but clean up after a daemon that died
+    if query_index_daemon([], []) is not None:
+        print(f'pre-push daemon: already running on {socket_path}')
+        return 1
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+
+    changed_files = set()
+    # the commit the watched paths were last found identical to
+    # (None == unknown), and the files inotify reported since
+    worktree = {"commit": None, "changed_files": set()}
+
+    def watch_relevant_dirs():
+        root_dirs = get_root_directories() or []
+        swagger_filepath = get_swagger_file_path()
+        subtrees = [CONSTANTS["EXTENSIONS_BASE_DIR"], *root_dirs]
+        for subtree in subtrees:
+            watcher.watch(subtree)
+            # renames/deletes of the subtree show up in its ancestors
+            parent_dir = os.path.dirname(subtree)
+            while parent_dir.startswith(CONSTANTS["REPO_BASE_DIR"]):
+                watcher.watch(parent_dir, recursive=False)
+                if parent_dir == CONSTANTS["REPO_BASE_DIR"]:
+                    break
+                parent_dir = os.path.dirname(parent_dir)
+        if swagger_filepath:
+            watcher.watch(os.path.dirname(swagger_filepath), recursive=False)
+        refresh_worktree_index()
+
+    def refresh_worktree_index():
+        dependency_index = get_dependency_index()
+        if dependency_index:
+            dependency_index.refresh(get_indexed_dirs())
+            dependency_index.fresh = True
+            dependency_index.get_namespace_trie() # loaded now, not by the next request
+
+    def get_watched_git_paths():
+        watched_paths = get_indexed_dirs()
+        swagger_filepath = get_swagger_file_path()
+        if swagger_filepath:
+            watched_paths.append(swagger_filepath)
+        return [get_git_relative_path(path) for path in watched_paths]
+
+    def worktree_matches(commit, git_paths):
+        import hashlib
+        listing = read_git_lines(["--literal-pathspecs", "ls-tree", "--full-tree", commit,
+                                  "--", *git_paths], check=True)
+        if listing is None:
+            return False
+        blobs = {} # git path -> (mode, blob id)
+        for record in listing:
+            metadata, _, git_path = record.partition("\t")
+            mode, _, object_id = metadata.split(" ")
+            blobs[git_path] = (mode, object_id)
+        for git_path in git_paths:
+            entry = get_cached_entry(os.path.join(CONSTANTS["REPO_BASE_DIR"], *git_path.split("/")))
+            blob = blobs.get(git_path)
+            if entry is None or blob is None:
+                if entry is not None or blob is not None:
+                    return False # only on one side (ignored files are in no listing)
+                continue
+            try:
+                if entry.is_symlink():
+                    content = os.fsencode(os.readlink(entry.path))
+                else:
+                    with open(entry.path, "rb") as file_handle:
+                        content = file_handle.read()
+            except OSError:
+                return False
+            if entry.is_symlink() != (blob[0] == "120000"):
+                return False
+            # the blob id git would give the file (sha1 or sha256 repositories)
+            object_hash = hashlib.new("sha256" if len(blob[1]) == 64 else "sha1")
+            object_hash.update(b"blob %d\0" % len(content))
+            object_hash.update(content)
+            if object_hash.hexdigest() != blob[1]:
+                return False
+        return True
+
+    def get_worktree_commit():
+        head = read_git_lines(["rev-parse", "--verify", "-q", "HEAD"])
+        if not head:
+            return None
+        head = head[0]
+        watched_git_paths = get_watched_git_paths()
+        if worktree["commit"] is None:
+            # untracked files count, they are in the listings but in no commit
+            changes = read_git_lines(["--literal-pathspecs", "status", "--porcelain",
+                                      "--untracked-files=normal", "--", *watched_git_paths],
+                                     check=True)
+            if changes != []:
+                return None
+            worktree["commit"] = head
+            worktree["changed_files"].clear()
+        # only what inotify reported, or what the two commits differ in, can differ
+        check_paths = {get_git_relative_path(path) for path in worktree["changed_files"]}
+        if head != worktree["commit"]:
+            differing_paths = read_git_lines(["--literal-pathspecs", "diff", "--name-only",
+                                              "--no-renames", worktree["commit"], head,
+                                              "--", *watched_git_paths], check=True)
+            if differing_paths is None:
+                worktree["commit"] = None
+                return None
+            check_paths.update(differing_paths)
+        watched_prefixes = tuple(f'{git_path}/' for git_path in watched_git_paths)
+        check_paths = [git_path for git_path in check_paths
+                       if git_path in watched_git_paths or git_path.startswith(watched_prefixes)]
+        if check_paths and not worktree_matches(head, check_paths):
+            return None # compared again (from the same starting point) next time
+        worktree["commit"] = head
+        worktree["changed_files"].clear()
+        return head
+
+    def apply_events():
+        select_analysis_source(None) # inotify state is about the working tree
+        for dir_path, name, mask in watcher.read_events():
+            if dir_path is None:
+                # events were lost: forget everything and rescan
+                DIRECTORY_LISTINGS.clear()
+                REPOSITORY_SCANS.clear()
+                if DEPENDENCY_INDEX:
+                    DEPENDENCY_INDEX.fresh = False
+                worktree["commit"] = None
+                continue
+            DIRECTORY_LISTINGS.pop(dir_path, None)
+            path = os.path.join(dir_path, name)
+            if mask & watcher.IN_ISDIR or mask & (watcher.IN_DELETE_SELF | watcher.IN_MOVE_SELF):
+                # dirs appeared/vanished: the scan and listings below are stale
+                DIRECTORY_LISTINGS.clear()
+                REPOSITORY_SCANS.clear()
+                if DEPENDENCY_INDEX:
+                    DEPENDENCY_INDEX.fresh = False
+                worktree["commit"] = None
+            elif name == CONSTANTS["SWAGGER_FILE_NAME"]:
+                REPOSITORY_SCANS.clear()
+                worktree["changed_files"].add(path)
+            elif name:
+                changed_files.add(path)
+                worktree["changed_files"].add(path)
+        if DEPENDENCY_INDEX and DEPENDENCY_INDEX.fresh and changed_files:
+            DEPENDENCY_INDEX.refresh_paths(changed_files)
+            changed_files.clear()
+        if not REPOSITORY_SCANS:
+            changed_files.clear() # covered by the full refresh
+            watch_relevant_dirs()
+        elif DEPENDENCY_INDEX and not DEPENDENCY_INDEX.fresh:
+            # a request for another commit re-keyed rows (see DependencyIndex.refresh)
+            changed_files.clear()
+            refresh_worktree_index()
+
+    def handle_request(connection):
+        with connection:
+            connection.settimeout(CONSTANTS["DAEMON_TIMEOUT_SECONDS"])
+            try:
+                request = json.loads(connection.makefile("rb").readline())
+                apply_events() # never answer from stale state
+                DEPENDENCY_GRAPHS.clear()
+                PROBE_RESULTS.clear() # reflog, notes, mtimes: may change any time
+                NAMESPACE_TRIES.pop(None, None) # the working tree's, inotify keeps no trie
+                refs = request.get("refs", [])
+                push_refs = [PushRef("", ref.get("local_oid"), "", ref.get("remote_oid", ""))
+                             for ref in refs]
+                files_by_ref = [PathTrie(ref.get("paths", [])) for ref in refs]
+                # the paths were computed for the client's decision mode
+                daemon_mode = ANALYSIS_STATE["decision_mode"]
+                ANALYSIS_STATE["decision_mode"] = request.get("mode", daemon_mode)
+                try:
+                    reply = {"rebuild": evaluate_push_refs(push_refs, files_by_ref,
+                                                           get_worktree_commit())}
+                finally:
+                    ANALYSIS_STATE["decision_mode"] = daemon_mode
+                    trim_commit_caches([push_ref.local_oid for push_ref in push_refs])
+            except (OSError, ValueError, AttributeError, sqlite3.Error,
+                    DependencyIndexError) as error:
+                reply = {"error": str(error)}
+            try:
+                connection.sendall((json.dumps(reply) + "\n").encode())
+            except OSError:
+                pass
+
+    watch_relevant_dirs()
+    get_worktree_commit()
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen()
+    selector = selectors.DefaultSelector()
+    selector.register(server, selectors.EVENT_READ, "request")
+    selector.register(watcher.fd, selectors.EVENT_READ, "inotify")
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(f'pre-push daemon: serving {CONSTANTS["REPO_BASE_DIR"]} on {socket_path}')
+    try:
+        while True:
+            for key, _ in selector.select():
+                if key.data == "inotify":
+                    apply_events()
+                else:
+                    connection, _ = server.accept()
+                    handle_request(connection)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+    return 0
+
 
 """
 sys.argv[0] == this script's name... params start from index 1
 sys.argv params: $script $remote(repo) $url(remote repo url)
-sys.argv params ctd: $local_ref $local_oid $remote_ref $remote_oid
+git writes one line per pushed ref on stdin:
+$local_ref $local_oid $remote_ref $remote_oid
+(the older form passing those four in sys.argv is still read)
+return: (list) of PushRef
+"""
+def read_push_refs():
+    if len(sys.argv) == 7:
+        return [PushRef(*sys.argv[3:7])]
+    push_refs = []
+    if sys.stdin is None or sys.stdin.isatty():
+        return push_refs
+    for line in sys.stdin:
+        fields = line.split()
+        if len(fields) == 4:
+            push_refs.append(PushRef(*fields))
+    return push_refs
+
+"""
 Checks if we are performing a push update and not a push 
 to delete a repo ... if conditions below both holds true:
-local_oid(index 4) == '0000000000000000000000000000000000000000'
-and if local_ref(index 3) == '(delete)' ...
+local_oid == '0000000000000000000000000000000000000000'
+and if local_ref == '(delete)' ...
+param: push_ref (PushRef)
 """
-def confirm_non_delete_push():
-    _, _, _, local_ref, local_oid, _, _ = sys.argv
-    condition_1 = local_ref == CONSTANTS["DELETE_PUSH_REF_VALUE"]
-    condition_2 = local_oid == CONSTANTS["DELETE_PUSH_HASH_VALUE"]
-    return not(condition_1 and condition_2)
+def confirm_non_delete_push(push_ref):
+    condition_1 = push_ref.local_ref == CONSTANTS["DELETE_PUSH_REF_VALUE"]
+    condition_2 = push_ref.local_oid == CONSTANTS["DELETE_PUSH_HASH_VALUE"]
+    return not(condition_1 or condition_2)
 
-if __name__=="__main__":
-    # only proceed if this is non-delete push
-    if confirm_non_delete_push():
+"""
+Function prints the rebuild decision of every ref
+param: push_refs (list of PushRef)
+param: verdicts (list of boolean or None)
+"""
+def report_push_verdicts(push_refs, verdicts):
+    if len(push_refs) < 2:
+        return # a single ref is reported by handle_push
+    for push_ref, rebuild in zip(push_refs, verdicts):
+        if rebuild is None:
+            decision = "no API directories found"
+        else:
+            decision = "rebuild needed" if rebuild else "rebuild not necessary"
+        print(f'{push_ref.local_ref} -> {push_ref.remote_ref}: {decision}')
+
+
+"""
+Function returns the git pathspecs of everything the rebuild
+decision looks at: every ROOT_DIRECTORIES dir and the swagger
+spec wherever they are (both are found by name, so a push
+adding or moving one is still covered) and the namespace
+base dir ... built from the config alone
+return: (list) of pathspecs (str)
+"""
+def get_api_pathspecs():
+    # the names are matched literally inside the glob
+    escape = lambda name: re.sub(r'([*?\[\\])', r'\\\1', name)
+    pathspecs = [f':(glob)**/{escape(name)}/**' for name in CONSTANTS["ROOT_DIRECTORIES"]]
+    pathspecs.append(f':(glob)**/{escape(CONSTANTS["SWAGGER_FILE_NAME"])}')
+    namespace_path = CONSTANTS["BASE_NAMESPACE_PATH"].replace("\\", "/")
+    pathspecs.append(f':(literal){namespace_path}')
+    return pathspecs
+
+
+"""
+Function settles a push before anything is scanned or
+parsed: one 'git diff --quiet' per ref over the API
+pathspecs ... quiet for every ref means no pushed commit
+touches a root dir, the namespaces or the swagger spec, so
+nothing the API depends on changed. New branches (nothing
+to diff against) and git failures (e.g. a remote oid that
+was never fetched) go through the full analysis
+param: push_refs (list of PushRef)
+return: (boolean) True when no ref changes an API path
+"""
+@traced("pathspec_check")
+def push_misses_api_paths(push_refs):
+    if not CONSTANTS["PATHSPEC_FAST_PATH"]:
+        return False
+    pathspecs = get_api_pathspecs()
+    for push_ref in push_refs:
+        if push_ref.remote_oid == CONSTANTS["DELETE_PUSH_HASH_VALUE"]:
+            return False
+        result = subprocess.run(["git", "diff", "--quiet", "--no-ext-diff", "--no-renames",
+                                 push_ref.remote_oid, push_ref.local_oid, "--", *pathspecs],
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                cwd=CONSTANTS["REPO_BASE_DIR"])
+        if result.returncode != 0:
+            return False # 1 == an API path changed, else git failed
+    return True
+
+
+"""
+Function walks the working tree and stats the swagger
+spec (a startup probe, in worktree mode)
+param: search_base_dir (str)
+"""
+def probe_working_tree(search_base_dir):
+    scan = scan_repository(search_base_dir)
+    get_swagger_modified_datetime(scan["swagger_file_path"])
+
+
+"""
+Function runs every independent startup probe at once,
+each on its own thread: the pushed files (git log), the
+reflog push date, the tree of every pushed commit (objects
+mode) or the working tree walk (worktree mode) ... the hook
+then waits for the slowest probe instead of their sum. The
+probes spend their time waiting on git, which releases the
+GIL, and their results land in the usual caches
+(PROBE_RESULTS, TREE_LISTINGS, REPOSITORY_SCANS) ... the
+wait ends with the decision budget
+param: push_refs (list of PushRef)
+param: remote_name (str)
+param: files_by_ref (list of PathTrie) optional, the pushed
+       paths when they were already read (see get_pushed_paths)
+return: (list) of PathTrie, one per ref
+"""
+@traced("startup_probes")
+def run_startup_probes(push_refs, remote_name, files_by_ref=None):
+    import threading
+    range_mode = ANALYSIS_STATE["decision_mode"] == "range"
+    # the range mode never looks at the reflog
+    probes = [] if range_mode else [(get_most_recent_push_datetime, ())]
+    if CONSTANTS["ANALYSIS_SOURCE"] == "objects":
+        delete_hash = CONSTANTS["DELETE_PUSH_HASH_VALUE"]
+        commits = {push_ref.local_oid for push_ref in push_refs
+                   if push_ref.local_oid != delete_hash}
+        probes.extend((load_tree_listings, (commit,)) for commit in commits)
+    else:
+        search_base_dir = get_search_base_directory()
+        if search_base_dir:
+            probes.append((probe_working_tree, (search_base_dir,)))
+
+    def run_probe(probe, args):
+        try:
+            probe(*args)
+        except DeadlineExceeded:
+            pass # the main thread stops at its own checkpoint
+
+    threads = [threading.Thread(target=run_probe, args=probe, daemon=True) for probe in probes]
+    for thread in threads:
+        thread.start()
+    if files_by_ref is not None:
+        join_before_deadline(threads)
+        return files_by_ref
+    if range_mode:
+        # the changed paths are checked against the root dirs while
+        # they are read, so the trees have to be there first
+        join_before_deadline(threads)
+        return get_files_in_push_range(push_refs, remote_name)
+    # the pushed files are needed by everything that follows
+    try:
+        files_by_ref = get_files_to_be_pushed(push_refs, remote_name)
+    finally:
+        join_before_deadline(threads)
+    return files_by_ref
+
+
+"""
+Function reads the pushed paths (as the decision mode
+defines them) and nothing else ... all an index daemon
+needs for its answer, so the thin client path lists no
+tree and reads no reflog
+param: push_refs (list of PushRef)
+param: remote_name (str)
+return: (list) of PathTrie, one per ref
+"""
+@traced("pushed_paths")
+def get_pushed_paths(push_refs, remote_name):
+    if ANALYSIS_STATE["decision_mode"] == "range":
+        # stopping early needs the root dirs, so the trees
+        return get_files_in_push_range(push_refs, remote_name, stop_early=False)
+    return get_files_to_be_pushed(push_refs, remote_name)
+
+
+"""
+Function returns the files a targeted build has to cover:
+the pushed files of the refs that need a rebuild, plus the
+files depending on them when the dependency index is loaded
+param: paths_by_ref (list of pushed paths, None when not all
+       were read, one per ref)
+param: verdicts (list of rebuild verdicts, one per ref)
+return: (set) of repo relative paths, None when not known
+"""
+def get_affected_paths(paths_by_ref, verdicts):
+    import sqlite3
+    affected_paths = set()
+    for pushed_paths, rebuild in zip(paths_by_ref, verdicts):
+        if rebuild and pushed_paths is None:
+            return None # only part of the push was read: build everything
+        if rebuild:
+            affected_paths.update(pushed_paths)
+    # already refreshed for this push (else the project references cover it)
+    if DEPENDENCY_INDEX and affected_paths:
+        try:
+            affected_paths = DEPENDENCY_INDEX.get_impacted_paths(affected_paths)
+        except sqlite3.Error:
+            pass
+    return affected_paths
+
+
+"""
+Function reads (once) the verdicts recorded in the git
+note of a pushed commit
+param: local_oid (str)
+return: (dict) remote_oid -> recorded verdict, {} when none
+"""
+def read_verdict_note(local_oid):
+    import json
+    probe_key = ("verdict_note", local_oid)
+    if probe_key not in PROBE_RESULTS:
+        result = subprocess.run(["git", "notes", f'--ref={CONSTANTS["VERDICT_NOTES_REF"]}',
+                                 "show", local_oid],
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                cwd=CONSTANTS["REPO_BASE_DIR"])
+        note = {}
+        if result.returncode == 0:
+            try:
+                note = json.loads(result.stdout)
+            except ValueError:
+                pass # not ours (or damaged): overwritten by the next record
+        PROBE_RESULTS[probe_key] = note if isinstance(note, dict) else {}
+    return PROBE_RESULTS[probe_key]
+
+
+"""
+Function returns what every recorded verdict depends on
+beyond the pushed commits: the rules (every configured
+CONSTANTS value and the decision mode in effect) and the
+analysis version (a hash of this hook's source) ... a change
+to either invalidates all recorded verdicts
+return: (dict) "rules" and "analysis" hashes
+"""
+def get_verdict_rules():
+    import hashlib
+    if "verdict_rules" not in PROBE_RESULTS:
+        rules = sorted((key, repr(value)) for key, value in CONFIGURED_CONSTANTS.items())
+        rules.append(("decision_mode", ANALYSIS_STATE["decision_mode"]))
+        with open(os.path.abspath(__file__), "rb") as source_file:
+            analysis_version = hashlib.sha1(source_file.read()).hexdigest()
+        PROBE_RESULTS["verdict_rules"] = {"rules": hashlib.sha1(repr(rules).encode()).hexdigest(),
+                                          "analysis": analysis_version}
+    return PROBE_RESULTS["verdict_rules"]
+
+
+"""
+Function returns the inputs of the heuristic decision that
+no commit pins down: the last push date (reflog) and the
+swagger spec's modification time ... a recorded heuristic
+verdict only holds while both are unchanged
+param: swagger_file_path (str) or None
+return: (dict) of epochs
+"""
+def get_heuristic_inputs(swagger_file_path):
+    return {"push_epoch": get_epoch_seconds(get_most_recent_push_datetime()),
+            "swagger_epoch": get_epoch_seconds(get_swagger_modified_datetime(swagger_file_path))}
+
+
+"""
+Function returns the input fingerprint of a ref's verdict:
+the rules, the root dirs and the swagger spec (path and blob)
+found in the pushed commit and, for the heuristic mode, the
+dates it compared ... needs the analysis of that ref to have
+run (the scan and the probes are cached by then)
+param: push_ref (PushRef)
+return: (dict) fingerprint, None when the commit was not analysed
+"""
+def get_verdict_fingerprint(push_ref):
+    if not select_analysis_source(push_ref.local_oid):
+        return None # analysed from the working tree: nothing to pin it to
+    fingerprint = dict(get_verdict_rules())
+    search_base_dir = get_search_base_directory()
+    scan = scan_repository(search_base_dir) if search_base_dir else {"swagger_file_path": None,
+                                                                     "root_dirs": []}
+    swagger_file_path = scan["swagger_file_path"]
+    fingerprint["root_dirs"] = [get_git_relative_path(root_dir) for root_dir in scan["root_dirs"]]
+    fingerprint["swagger_path"] = None
+    fingerprint["swagger_blob"] = None
+    if swagger_file_path:
+        fingerprint["swagger_path"] = get_git_relative_path(swagger_file_path)
+        swagger_entry = list_directory(os.path.dirname(swagger_file_path)).get(
+            os.path.basename(swagger_file_path))
+        fingerprint["swagger_blob"] = getattr(swagger_entry, "object_id", None)
+    if ANALYSIS_STATE["decision_mode"] != "range":
+        fingerprint.update(get_heuristic_inputs(swagger_file_path))
+    return fingerprint
+
+
+"""
+Function looks the push up in the recorded verdicts (git
+notes on the pushed commits, see record_push_verdicts) ...
+only when every ref has a record for its exact (local_oid,
+remote_oid) whose fingerprint still holds: same rules and
+analysis version and, in the heuristic mode, the same push
+date and swagger modification time. In the range mode that
+is one 'git notes show' per ref and nothing else
+param: push_refs (list of PushRef)
+return: (list) of recorded verdicts (dict), one per ref, or None
+"""
+@traced("verdict_notes")
+def get_recorded_verdicts(push_refs):
+    if not CONSTANTS["VERDICT_NOTES_REF"] or CONSTANTS["ANALYSIS_SOURCE"] != "objects":
+        return None # the working tree is not pinned down by any commit
+    rules = get_verdict_rules()
+    records = []
+    for push_ref in push_refs:
+        record = read_verdict_note(push_ref.local_oid).get(push_ref.remote_oid)
+        if not isinstance(record, dict) or not isinstance(record.get("fingerprint"), dict):
+            return None
+        fingerprint = record["fingerprint"]
+        if any(fingerprint.get(key) != value for key, value in rules.items()):
+            return None
+        if ANALYSIS_STATE["decision_mode"] != "range":
+            swagger_path = fingerprint.get("swagger_path")
+            swagger_file_path = None
+            if swagger_path:
+                swagger_file_path = os.path.join(CONSTANTS["REPO_BASE_DIR"], *swagger_path.split("/"))
+            inputs = get_heuristic_inputs(swagger_file_path)
+            if any(fingerprint.get(key) != value for key, value in inputs.items()):
+                return None
+        records.append(record)
+    return records
+
+
+"""
+Function records the verdict, input fingerprint and build
+outcome of every ref in a git note on its pushed commit
+(VERDICT_NOTES_REF), keyed there by the remote oid, so a
+retried push or the same commit pushed elsewhere is answered
+by get_recorded_verdicts ... unchanged records are not
+written again, failures just leave nothing recorded
+param: push_refs (list of PushRef)
+param: records (list of verdict records, one per ref)
+"""
+@traced("verdict_notes")
+def record_push_verdicts(push_refs, records):
+    import json
+    if not CONSTANTS["VERDICT_NOTES_REF"] or CONSTANTS["ANALYSIS_SOURCE"] != "objects":
+        return
+    for push_ref, record in zip(push_refs, records):
+        if record["fingerprint"] is None:
+            continue # not pinned to its inputs: nothing to record
+        note = read_verdict_note(push_ref.local_oid)
+        if note.get(push_ref.remote_oid) == record:
+            continue
+        note[push_ref.remote_oid] = record
+        subprocess.run(["git", "notes", f'--ref={CONSTANTS["VERDICT_NOTES_REF"]}',
+                        "add", "-f", "-F", "-", push_ref.local_oid],
+                       input=json.dumps(note, indent=1, sort_keys=True).encode(),
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                       cwd=CONSTANTS["REPO_BASE_DIR"])
+
+
+"""
+Function decides the push, cheapest stage first: the
+pathspec check, a running index daemon (asked with just the
+pushed paths), the recorded verdicts, the startup probes,
+then per ref the swagger check, the direct hits and the
+dependency closure (see evaluate_push) ... every stage can
+settle the verdict on its own and every one of them stops
+at the decision deadline (DeadlineExceeded)
+param: push_refs (list of PushRef)
+param: remote_name (str) as given to the hook
+return: (list) of verdict records, one per ref, None when
+        the push touches no API path
+"""
+def decide_push(push_refs, remote_name):
+    # a push that touches no API path is settled by git alone
+    enter_decision_stage("pathspec check")
+    if push_misses_api_paths(push_refs):
+        return None
+    # a running index daemon answers from warm state, it only
+    # needs the pushed paths (nothing is recorded for its answer)
+    files_by_ref = None
+    socket_path = get_daemon_socket_path()
+    if socket_path and os.path.exists(socket_path):
+        enter_decision_stage("index daemon")
+        files_by_ref = get_pushed_paths(push_refs, remote_name)
+        verdicts = query_index_daemon(push_refs, files_by_ref)
+        if verdicts is not None:
+            return [{"rebuild": rebuild, "paths": sorted(files_to_be_pushed),
+                     "build_status": None, "fingerprint": None}
+                    for files_to_be_pushed, rebuild in zip(files_by_ref, verdicts)]
+    # a retried push (or the same one to another remote) was decided before
+    enter_decision_stage("recorded verdicts")
+    records = get_recorded_verdicts(push_refs)
+    if records is not None:
+        print("Same push as before, reusing its recorded verdict")
+        return records
+
+    # the independent git/filesystem probes all run at once, then the
+    # whole analysis runs in this process (once for all refs)
+    enter_decision_stage("startup probes")
+    files_by_ref = run_startup_probes(push_refs, remote_name, files_by_ref)
+    verdicts = evaluate_push_refs(push_refs, files_by_ref)
+    return [{"rebuild": rebuild,
+             # None == only part of the push was read
+             "paths": None if files_to_be_pushed.rebuild_path else sorted(files_to_be_pushed),
+             "build_status": None,
+             "fingerprint": get_verdict_fingerprint(push_ref)}
+            for push_ref, files_to_be_pushed, rebuild
+            in zip(push_refs, files_by_ref, verdicts)]
+
+
+"""
+Function hands the decision that ran out of budget to a
+background process (python pre-push.py --analyse, the push
+lines on its stdin): it runs every stage without a budget,
+which warms the caches on the way (dependency index, trees,
+commit-graph), and records the verdicts in the git notes,
+so the next push of the same commits is answered at once
+... only one such process runs at a time (WARM_LOCK_FILE)
+param: push_refs (list of PushRef)
+param: remote_name (str) as given to the hook
+return: boolean, False when none was started
+"""
+def start_background_analysis(push_refs, remote_name):
+    git_dir = get_git_directory()
+    if not git_dir:
+        return False
+    lock_path = os.path.join(git_dir, CONSTANTS["WARM_LOCK_FILE"])
+    try:
+        if time.time() - os.path.getmtime(lock_path) < CONSTANTS["WARM_LOCK_SECONDS"]:
+            return False # still analysing the last push
+        os.remove(lock_path) # left behind by a dead analysis
+    except OSError:
+        pass
+    try:
+        os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except OSError:
+        return False # lost the race to another hook
+
+    command = [sys.executable, os.path.abspath(__file__), "--analyse", remote_name,
+               f'--decision-mode={ANALYSIS_STATE["decision_mode"]}']
+    # the background analysis neither traces nor profiles into our files
+    environment = {key: value for key, value in os.environ.items()
+                   if key not in ("PRE_PUSH_TRACE", "PRE_PUSH_PROFILE")}
+    push_lines = "".join(f'{push_ref.local_ref} {push_ref.local_oid} '
+                         f'{push_ref.remote_ref} {push_ref.remote_oid}\n'
+                         for push_ref in push_refs)
+    try:
+        process = subprocess.Popen(command, stdin=subprocess.PIPE,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                   cwd=CONSTANTS["REPO_BASE_DIR"], env=environment,
+                                   start_new_session=True) # outlives the push
+        process.stdin.write(push_lines.encode())
+        process.stdin.close()
+    except OSError:
+        os.remove(lock_path)
+        return False
+    return True
+
+
+"""
+Function is the background analysis started by
+start_background_analysis: the decision of the push
+given on stdin without a budget, recorded in the git
+notes ... nothing is built
+param: remote_name (str) as given to the hook
+return: exit status (always 0)
+"""
+def run_background_analysis(remote_name):
+    push_refs = [push_ref for push_ref in read_push_refs() if confirm_non_delete_push(push_ref)]
+    try:
+        if push_refs:
+            save_extensions_base_directory_path()
+            records = decide_push(push_refs, remote_name)
+            if records is not None:
+                record_push_verdicts(push_refs, records)
+    finally:
+        git_dir = get_git_directory()
+        if git_dir:
+            try:
+                os.remove(os.path.join(git_dir, CONSTANTS["WARM_LOCK_FILE"]))
+            except OSError:
+                pass
+    return 0
+
+
+"""
+Function runs the hook for every ref of the push ... the
+decision is bounded by DECISION_BUDGET_SECONDS: past it
+every undecided ref is rebuilt in full (the conservative
+verdict) and the decision goes on in the background ... a
+failing dependency index gets the conservative verdict too
+param: remote_name (str) as given to the hook
+return: exit status of the build (0 when nothing was built)
+"""
+def run_hook(remote_name):
+    # only proceed for the refs that are non-delete pushes
+    push_refs = [push_ref for push_ref in read_push_refs() if confirm_non_delete_push(push_ref)]
+    if push_refs:
         # save the base directory path for namespaces included in
         # relevant files in dirs: i.e. Controllers and Attributes
         save_extensions_base_directory_path()
+        start_decision_deadline()
+        try:
+            records = decide_push(push_refs, remote_name)
+        except DeadlineExceeded as exceeded:
+            TRACER.count("decision_deadline_exceeded")
+            print(f'Decision budget of {DECISION_DEADLINE["budget"]:g}s spent in the '
+                  f'{exceeded.args[0]} stage ({DECISION_DEADLINE["decided_refs"]} of '
+                  f'{len(push_refs)} refs decided), rebuilding to be safe')
+            if start_background_analysis(push_refs, remote_name):
+                print("The rest of the analysis runs in the background for the next push")
+            records = [{"rebuild": True, "paths": None, "build_status": None, "fingerprint": None}
+                       for push_ref in push_refs]
+        except DependencyIndexError as error:
+            print(f'Dependency index failed ({error}), dropped it and rebuilding to be safe')
+            records = [{"rebuild": True, "paths": None, "build_status": None, "fingerprint": None}
+                       for push_ref in push_refs]
+        finally:
+            stop_decision_deadline()
+        if records is None:
+            print("Rebuild not necessary :)")
+            return 0
+        verdicts = [record["rebuild"] for record in records]
+        report_push_verdicts(push_refs, verdicts)
+        # None means no root dirs were found for that ref
+        decided = [rebuild for rebuild in verdicts if rebuild is not None]
+        build_status = 0
+        if decided:
+            # one build covers every ref
+            paths_by_ref = [record["paths"] for record in records]
+            pushed_commits = [push_ref.local_oid for push_ref, rebuild
+                              in zip(push_refs, verdicts) if rebuild]
+            build_status = handle_push(any(decided), get_affected_paths(paths_by_ref, verdicts),
+                                       pushed_commits)
+        records = [dict(record, build_status=build_status if record["rebuild"] else None)
+                   for record in records]
+        record_push_verdicts(push_refs, records)
+        return build_status
+    return 0
 
-        # get the relevant paths and directories to init query
-        swagger_filepath = get_swagger_file_path()
-        root_dirs = get_root_directories()
-        files_to_be_pushed = get_files_to_be_pushed()
-        swagger_most_recent_mod = get_swagger_modified_datetime(swagger_filepath)
-        global_most_recent_push = get_most_recent_push_datetime()
-        
-        # print("swagger_path: " + swagger_filepath)
-        # print("root_dirs: ", root_dirs)
-        # print("files_to_be_pushed: ", files_to_be_pushed)
-        # print("swagger_mod_dt: ", swagger_most_recent_mod)
-        # print("most_recent_push: ", global_most_recent_push)
-
-        # only proceed if root_dirs != None
-        if root_dirs:
-            rebuild = check_for_api_committed_changes(root_dirs, 
-                                                    swagger_most_recent_mod, 
-                                                    global_most_recent_push,
-                                                    files_to_be_pushed)
-            handle_push(rebuild) # handles rebuilding before push
+
+if __name__=="__main__":
+    profile_path = configure_options()
+
+    # python pre-push.py --daemon keeps the analysis warm in the background
+    if sys.argv[1:] == ["--daemon"]:
+        sys.exit(run_index_daemon())
+    # python pre-push.py --analyse <remote> finishes a decision that ran
+    # out of budget (see start_background_analysis)
+    if sys.argv[1:2] == ["--analyse"]:
+        sys.exit(run_background_analysis(sys.argv[2] if len(sys.argv) > 2 else "origin"))
+
+    remote_name = sys.argv[1] if len(sys.argv) > 1 else "origin"
+    try:
+        if profile_path:
+            import cProfile
+            profiler = cProfile.Profile()
+            try:
+                exit_status = profiler.runcall(run_hook, remote_name)
+            finally:
+                profiler.dump_stats(profile_path)
+        else:
+            exit_status = run_hook(remote_name)
+    finally:
+        TRACER.finish()
     
-    # always return 0 for success
-    sys.exit(0)
\ No newline at end of file
+    # return 0 for success ... a failed build only aborts
+    # the push when asked to (git aborts on any non zero)
+    sys.exit(exit_status if CONSTANTS["ABORT_PUSH_ON_FAILURE"] else 0)